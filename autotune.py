@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Interpreter auto-tuner for TeaLeafNet
+Benchmarks each stage model on this host across thread counts, XNNPACK
+on/off and interpreter pool sizes, then writes the best settings to the
+tuning file read by TeaLeafModel at startup. Every invoke is a single
+image, as the server runs them.
+"""
+
+import tensorflow as tf
+import numpy as np
+import argparse
+import itertools
+import json
+import os
+import platform
+import threading
+import time
+
+# Resize inputs exactly as the server does
+from google_colab_server import UnsupportedInputSizeError, resize_input
+
+DEFAULT_MODELS = {
+    'stage1': ('models/leaf_detection.tflite', (160, 160)),
+    'stage2': ('models/disease_classification.tflite', (512, 512))
+}
+DEFAULT_TUNING_PATH = os.environ.get('TEALEAF_TUNING_PATH', 'tealeaf_tuning.json')
+
+def create_interpreter(model_path, input_size, num_threads, xnnpack):
+    """Create an interpreter for one configuration, or None if the model can't take input_size"""
+    options = {'num_threads': num_threads}
+    if not xnnpack:
+        options['experimental_op_resolver_type'] = \
+            tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+
+    interpreter = tf.lite.Interpreter(model_path=model_path, **options)
+    try:
+        resize_input(interpreter, input_size)
+    except UnsupportedInputSizeError:
+        return None
+
+    return interpreter
+
+def run_worker(interpreter, invocations, latencies):
+    """Invoke an interpreter repeatedly, recording latencies"""
+    input_details = interpreter.get_input_details()[0]
+    interpreter.set_tensor(input_details['index'],
+                           np.random.rand(*input_details['shape']).astype(np.float32))
+
+    for _ in range(invocations):
+        start = time.perf_counter()
+        interpreter.invoke()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+def benchmark_config(model_path, input_size, num_threads, xnnpack, pool_size, invocations, warmup):
+    """Throughput and latency of one configuration with pool_size concurrent interpreters"""
+    interpreters = []
+    for _ in range(pool_size):
+        interpreter = create_interpreter(model_path, input_size, num_threads, xnnpack)
+        if interpreter is None:
+            return None
+        interpreters.append(interpreter)
+
+    for interpreter in interpreters:
+        run_worker(interpreter, warmup, [])
+
+    latencies = []
+    workers = [threading.Thread(target=run_worker, args=(interpreter, invocations, latencies))
+               for interpreter in interpreters]
+
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    images = pool_size * invocations
+    return {
+        'num_threads': num_threads,
+        'xnnpack': xnnpack,
+        'pool_size': pool_size,
+        'throughput_ips': images / elapsed,
+        'latency_ms': float(np.mean(latencies)),
+        'p95_latency_ms': float(np.percentile(latencies, 95))
+    }
+
+def candidate_configs(thread_options, pool_options, cpu_count):
+    """Configurations worth trying on a host with cpu_count cores"""
+    for num_threads, xnnpack, pool_size in itertools.product(thread_options, (True, False), pool_options):
+        # Oversubscribing cores only adds contention
+        if num_threads * pool_size > cpu_count * 2:
+            continue
+        yield num_threads, xnnpack, pool_size
+
+def pick_best(results, objective, max_latency_ms):
+    """Best configuration for the objective within the latency limit"""
+    eligible = [r for r in results if max_latency_ms is None or r['p95_latency_ms'] <= max_latency_ms]
+    if not eligible:
+        print(f"⚠️  No configuration meets p95 <= {max_latency_ms} ms, ignoring the limit")
+        eligible = results
+
+    if objective == 'latency':
+        return min(eligible, key=lambda r: r['latency_ms'])
+    return max(eligible, key=lambda r: r['throughput_ips'])
+
+def tune_stage(stage, model_path, input_size, args):
+    """Benchmark every candidate configuration of one stage"""
+    cpu_count = os.cpu_count() or 1
+    thread_options = sorted({1, 2, 4, cpu_count} if args.threads is None else set(args.threads))
+    thread_options = [t for t in thread_options if t <= cpu_count]
+
+    print(f"\n⚙️  Tuning {stage} ({model_path}) on {cpu_count} cores...")
+    results = []
+    for num_threads, xnnpack, pool_size in candidate_configs(thread_options, args.pool_sizes, cpu_count):
+        result = benchmark_config(model_path, input_size, num_threads, xnnpack, pool_size,
+                                  args.invocations, args.warmup)
+        if result is None:
+            print(f"  ⚠️  {model_path} does not accept {input_size[0]}x{input_size[1]} input")
+            return None, []
+
+        results.append(result)
+        print(f"  threads={num_threads} xnnpack={'on ' if xnnpack else 'off'} pool={pool_size}: "
+              f"{result['throughput_ips']:7.1f} img/s, "
+              f"{result['latency_ms']:7.2f} ms (p95 {result['p95_latency_ms']:.2f})")
+
+    best = pick_best(results, args.objective, args.max_latency_ms)
+    print(f"✅ Best {stage}: threads={best['num_threads']} xnnpack={best['xnnpack']} "
+          f"pool={best['pool_size']}")
+    return best, results
+
+def main():
+    """Tune both stages and write the tuning file"""
+    parser = argparse.ArgumentParser(description='Auto-tune TeaLeafNet interpreter settings for this host')
+    parser.add_argument('--stage1', default=DEFAULT_MODELS['stage1'][0], help='Stage 1 model path')
+    parser.add_argument('--stage2', default=DEFAULT_MODELS['stage2'][0], help='Stage 2 model path')
+    parser.add_argument('--stage2-resolution', type=int, default=DEFAULT_MODELS['stage2'][1][0],
+                        help='Stage 2 input resolution to tune at')
+    parser.add_argument('--threads', type=int, nargs='+', default=None, help='Thread counts to try')
+    parser.add_argument('--pool-sizes', type=int, nargs='+', default=[1, 2, 4], help='Pool sizes to try')
+    parser.add_argument('--invocations', type=int, default=20, help='Timed invocations per interpreter')
+    parser.add_argument('--warmup', type=int, default=3, help='Warm-up invocations per interpreter')
+    parser.add_argument('--objective', choices=['throughput', 'latency'], default='throughput',
+                        help='What to optimise for')
+    parser.add_argument('--max-latency-ms', type=float, default=None,
+                        help='Reject configurations with a higher p95 latency')
+    parser.add_argument('--output', default=DEFAULT_TUNING_PATH, help='Tuning file to write')
+    args = parser.parse_args()
+
+    stages = {
+        'stage1': (args.stage1, DEFAULT_MODELS['stage1'][1]),
+        'stage2': (args.stage2, (args.stage2_resolution, args.stage2_resolution))
+    }
+
+    tuning = {
+        'host': platform.node(),
+        'cpu_count': os.cpu_count(),
+        'objective': args.objective,
+        'tensorflow_version': tf.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'candidates': {}
+    }
+
+    for stage, (model_path, input_size) in stages.items():
+        if not os.path.exists(model_path):
+            print(f"⚠️  Model not found: {model_path}")
+            continue
+        best, results = tune_stage(stage, model_path, input_size, args)
+        if best is None:
+            continue
+        tuning[stage] = best
+        tuning['candidates'][stage] = results
+
+    with open(args.output, 'w') as f:
+        json.dump(tuning, f, indent=2)
+
+    print(f"\n📋 Tuning written to {args.output}")
+    print("TeaLeafModel picks it up at startup (TEALEAF_TUNING_PATH to override the path)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Shared fixtures for the TeaLeafNet stage micro-benchmarks
+Serves the stand-in TFLite models from standin_fixtures.py so the suite runs
+anywhere, and compares timings against the committed baseline
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+import tensorflow as tf
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from standin_fixtures import IMAGE_SIZES, build_standin_model, fixture_image
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+GOLDEN_PATH = os.path.join(BENCHMARK_DIR, 'golden_outputs.json')
+
+def pytest_addoption(parser):
+    parser.addoption('--update-baseline', action='store_true',
+                     help='Rewrite baseline.json and golden_outputs.json from this run')
+    parser.addoption('--benchmark-threshold', type=float, default=2.0,
+                     help='Fail when a stage is slower than baseline times this factor')
+    parser.addoption('--benchmark-min-slack-ms', type=float, default=2.0,
+                     help='Always allow at least this much over baseline (timer noise on fast stages)')
+    parser.addoption('--benchmark-rounds', type=int, default=10,
+                     help='Timed rounds per benchmark')
+
+@pytest.fixture(scope='session')
+def tea_model(tmp_path_factory):
+    """TeaLeafModel backed by the stand-in models"""
+    from google_colab_server import TeaLeafModel, DEFAULT_STAGE_SETTINGS
+
+    model_dir = tmp_path_factory.mktemp('models')
+    settings = dict(DEFAULT_STAGE_SETTINGS, num_threads=1)
+    return TeaLeafModel(
+        leaf_model_path=build_standin_model(160, 1, str(model_dir / 'leaf.tflite'), seed=3),
+        disease_model_path=build_standin_model(512, 4, str(model_dir / 'disease.tflite'), seed=2),
+        leaf_input_size=(160, 160),
+        disease_input_size=(512, 512),
+        model_urls={},
+        tuning={'stage1': settings, 'stage2': settings}
+    )
+
+@pytest.fixture(scope='session')
+def fixture_images():
+    """Base64 fixture images keyed by size name"""
+    return {name: fixture_image(width, height, seed=index)
+            for index, (name, (width, height)) in enumerate(IMAGE_SIZES.items())}
+
+def calibration_workload(_pixels=np.random.RandomState(0).rand(600, 800, 3).astype(np.float32)):
+    """Fixed CPU work resembling the pipeline (resize plus array maths)"""
+    image = Image.fromarray((_pixels * 255).astype(np.uint8)).resize((512, 512))
+    array = np.asarray(image, dtype=np.float32)
+    array /= 255.0
+    return float(array.sum())
+
+def best_time_ms(fn, rounds):
+    """Fastest of several timed calls in ms"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings), timings
+
+def load_json(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+class BenchmarkRecorder:
+    """Times stages and compares them against the stored baseline"""
+
+    def __init__(self, config):
+        self.update = config.getoption('--update-baseline')
+        self.threshold = config.getoption('--benchmark-threshold')
+        self.min_slack_ms = config.getoption('--benchmark-min-slack-ms')
+        self.rounds = config.getoption('--benchmark-rounds')
+        self.baseline = load_json(BASELINE_PATH).get('stages', {})
+        self.golden = load_json(GOLDEN_PATH)
+        self.results = {}
+        self.outputs = {}
+
+    def measure(self, name, fn, warmup=2):
+        """Best wall time of fn in ms, failing on regression past the threshold"""
+        for _ in range(warmup):
+            fn()
+
+        # The fastest round is the least disturbed by other load on the host
+        best_ms, timings = best_time_ms(fn, self.rounds)
+
+        # Time a fixed workload right next to the stage to measure how fast the host is right now
+        calibration_ms, _ = best_time_ms(calibration_workload, self.rounds)
+
+        self.results[name] = {
+            'min_ms': round(best_ms, 4),
+            'median_ms': round(float(np.median(timings)), 4),
+            'calibration_ms': round(calibration_ms, 4)
+        }
+
+        baseline = self.baseline.get(name)
+        if not self.update and baseline is not None:
+            # Scale the baseline to the current host speed before comparing
+            expected_ms = baseline['min_ms'] * calibration_ms / baseline['calibration_ms']
+            limit = max(expected_ms * self.threshold, expected_ms + self.min_slack_ms)
+            assert best_ms <= limit, (
+                f"{name} regressed: {best_ms:.3f} ms vs {expected_ms:.3f} ms expected from baseline "
+                f"(limit {limit:.3f} ms)"
+            )
+        return best_ms
+
+    def check_output(self, name, output, tolerance=1e-4):
+        """Compare an analysis result with its golden output"""
+        self.outputs[name] = output
+        expected = self.golden.get(name)
+        if self.update or expected is None:
+            return
+
+        for key, value in expected.items():
+            if isinstance(value, float):
+                assert abs(output[key] - value) <= tolerance, f"{name}.{key}: {output[key]} != {value}"
+            else:
+                assert output[key] == value, f"{name}.{key}: {output[key]} != {value}"
+
+    def save(self):
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({
+                'host': {'cpu_count': os.cpu_count(), 'tensorflow_version': tf.__version__},
+                'rounds': self.rounds,
+                'stages': dict(sorted(self.results.items()))
+            }, f, indent=2)
+        with open(GOLDEN_PATH, 'w') as f:
+            json.dump(dict(sorted(self.outputs.items())), f, indent=2)
+
+@pytest.fixture(scope='session')
+def benchmark(request):
+    recorder = BenchmarkRecorder(request.config)
+    yield recorder
+    if recorder.update:
+        recorder.save()
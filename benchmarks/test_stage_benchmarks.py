@@ -0,0 +1,41 @@
+"""
+Stage-level micro-benchmarks for the TeaLeafNet pipeline
+Run with: python -m pytest benchmarks -q
+Refresh the stored baseline with: python -m pytest benchmarks --update-baseline
+"""
+
+import pytest
+
+from standin_fixtures import IMAGE_SIZES
+
+@pytest.mark.parametrize('size', IMAGE_SIZES)
+def test_preprocess_image_stage1(benchmark, tea_model, fixture_images, size):
+    benchmark.measure(f'preprocess_image[stage1-{size}]',
+                      lambda: tea_model.preprocess_image(fixture_images[size], tea_model.leaf_input_size))
+
+@pytest.mark.parametrize('size', IMAGE_SIZES)
+def test_preprocess_image_stage2(benchmark, tea_model, fixture_images, size):
+    benchmark.measure(f'preprocess_image[stage2-{size}]',
+                      lambda: tea_model.preprocess_image(fixture_images[size], tea_model.disease_input_size))
+
+@pytest.mark.parametrize('size', IMAGE_SIZES)
+def test_detect_leaf(benchmark, tea_model, fixture_images, size):
+    image = tea_model.decode_image(fixture_images[size])
+    benchmark.measure(f'detect_leaf[{size}]', lambda: tea_model.detect_leaf(image))
+
+@pytest.mark.parametrize('size', IMAGE_SIZES)
+def test_classify_disease(benchmark, tea_model, fixture_images, size):
+    image = tea_model.decode_image(fixture_images[size])
+    benchmark.measure(f'classify_disease[{size}]', lambda: tea_model.classify_disease(image))
+
+@pytest.mark.parametrize('size', IMAGE_SIZES)
+def test_analyze_image(benchmark, tea_model, fixture_images, size):
+    benchmark.measure(f'analyze_image[{size}]', lambda: tea_model.analyze_image(fixture_images[size]))
+
+@pytest.mark.parametrize('size', IMAGE_SIZES)
+def test_golden_outputs(benchmark, tea_model, fixture_images, size):
+    result = tea_model.analyze_image(fixture_images[size])
+    benchmark.check_output(f'analyze_image[{size}]', result)
+
+    # Stage 1 and 2 errors are swallowed into zero confidence, so catch them here
+    assert result['leafConfidence'] > 0.0
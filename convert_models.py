@@ -1,73 +1,211 @@
 #!/usr/bin/env python3
 """
-Script to convert TensorFlow Lite models to TensorFlow.js format
-This allows us to use the models in React Native with Expo
+Conversion pipeline for the TeaLeafNet stage models
+Exports the TFLite models to other deployable formats, checks each artifact
+for numerical parity with the TFLite reference and benchmarks load time and
+inference latency so the fastest correct format can be picked
 """
 
 import tensorflow as tf
-import tensorflowjs as tfjs
+import numpy as np
+import argparse
+import json
 import os
+import shutil
+import time
 
-def convert_tflite_to_tfjs(tflite_path, output_dir):
-    """
-    Convert a TensorFlow Lite model to TensorFlow.js format
-    
-    Args:
-        tflite_path: Path to the .tflite file
-        output_dir: Directory to save the converted model
-    """
-    try:
-        # Create output directory if it doesn't exist
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Load the TFLite model
-        interpreter = tf.lite.Interpreter(model_path=tflite_path)
-        interpreter.allocate_tensors()
-        
-        # Get input and output details
-        input_details = interpreter.get_input_details()
-        output_details = interpreter.get_output_details()
-        
-        print(f"Converting {tflite_path}...")
-        print(f"Input shape: {input_details[0]['shape']}")
-        print(f"Output shape: {output_details[0]['shape']}")
-        
-        # For now, we'll create a simple conversion
-        # In practice, you might need to reconstruct the model architecture
-        # and load the weights from the TFLite file
-        
-        print(f"✅ Model converted successfully to {output_dir}")
-        
-    except Exception as e:
-        print(f"❌ Error converting {tflite_path}: {e}")
+# Stage models and their input sizes
+STAGE_MODELS = [
+    {
+        'name': 'stage1_nonleaf',
+        'tflite_path': 'stage1_nonleaf.tflite',
+        'input_size': (160, 160)
+    },
+    {
+        'name': 'stage2_Tea_disease',
+        'tflite_path': 'stage2_Tea_disease.tflite',
+        'input_size': (512, 512)
+    }
+]
+
+DEFAULT_TARGETS = ['tflite', 'onnx', 'onnx_optimized']
+
+class TFLiteRunner:
+    """Reference runner for the original .tflite file"""
+
+    def __init__(self, path):
+        self.interpreter = tf.lite.Interpreter(model_path=path)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+
+    def run(self, input_data):
+        self.interpreter.set_tensor(self.input_index, input_data)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index)
+
+class ONNXRunner:
+    """Runner for .onnx artifacts using onnxruntime"""
+
+    def __init__(self, path):
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def run(self, input_data):
+        return self.session.run(None, {self.input_name: input_data})[0]
+
+def convert_to_tflite(tflite_path, output_dir):
+    """Copy the reference model so every target is benchmarked the same way"""
+    output_path = os.path.join(output_dir, os.path.basename(tflite_path))
+    shutil.copyfile(tflite_path, output_path)
+    return output_path, TFLiteRunner
+
+def convert_to_onnx(tflite_path, output_dir):
+    """Convert a TFLite model to ONNX with tf2onnx"""
+    import tf2onnx
+
+    name = os.path.splitext(os.path.basename(tflite_path))[0]
+    output_path = os.path.join(output_dir, f'{name}.onnx')
+    tf2onnx.convert.from_tflite(tflite_path, output_path=output_path)
+    return output_path, ONNXRunner
+
+def convert_to_onnx_optimized(tflite_path, output_dir):
+    """ONNX model with onnxruntime's graph optimizations applied ahead of time"""
+    import onnxruntime as ort
+
+    onnx_path, _ = convert_to_onnx(tflite_path, output_dir)
+    output_path = onnx_path.replace('.onnx', '.optimized.onnx')
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    options.optimized_model_filepath = output_path
+    ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+    return output_path, ONNXRunner
+
+CONVERTERS = {
+    'tflite': convert_to_tflite,
+    'onnx': convert_to_onnx,
+    'onnx_optimized': convert_to_onnx_optimized
+}
+
+def sample_inputs(input_size, count, seed=0):
+    """Deterministic sample inputs in the [0, 1] range the models expect"""
+    rng = np.random.RandomState(seed)
+    return [rng.rand(1, input_size[1], input_size[0], 3).astype(np.float32) for _ in range(count)]
+
+def check_parity(reference, runner, inputs, atol):
+    """Compare an artifact's outputs with the TFLite reference"""
+    max_abs_diff = 0.0
+    argmax_matches = 0
+
+    for input_data in inputs:
+        expected = reference.run(input_data)
+        actual = np.asarray(runner.run(input_data)).reshape(expected.shape)
+        max_abs_diff = max(max_abs_diff, float(np.max(np.abs(expected - actual))))
+        # Single-output models are binary classifiers thresholded at 0.5
+        if expected.size == 1:
+            agrees = (expected.item() > 0.5) == (actual.item() > 0.5)
+        else:
+            agrees = np.argmax(expected) == np.argmax(actual)
+        if agrees:
+            argmax_matches += 1
+
+    return {
+        'max_abs_diff': max_abs_diff,
+        'argmax_agreement': argmax_matches / len(inputs),
+        'passed': max_abs_diff <= atol and argmax_matches == len(inputs)
+    }
+
+def benchmark_artifact(runner_class, path, input_data, runs, warmup):
+    """Load time and inference latency of one artifact"""
+    start = time.perf_counter()
+    runner = runner_class(path)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    for _ in range(warmup):
+        runner.run(input_data)
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        runner.run(input_data)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return runner, {
+        'load_ms': round(load_ms, 3),
+        'latency_ms': round(float(np.mean(timings)), 3),
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3)
+    }
+
+def convert_model(model, targets, output_dir, args):
+    """Convert one stage model to every target and validate the artifacts"""
+    print(f"\n🔄 Converting {model['tflite_path']}...")
+    model_dir = os.path.join(output_dir, model['name'])
+    os.makedirs(model_dir, exist_ok=True)
+
+    reference = TFLiteRunner(model['tflite_path'])
+    inputs = sample_inputs(model['input_size'], args.samples)
+    results = {}
+
+    for target in targets:
+        try:
+            path, runner_class = CONVERTERS[target](model['tflite_path'], model_dir)
+            runner, timing = benchmark_artifact(runner_class, path, inputs[0], args.runs, args.warmup)
+            parity = check_parity(reference, runner, inputs, args.atol)
+        except Exception as e:
+            print(f"  ❌ {target}: {e}")
+            results[target] = {'error': str(e)}
+            continue
+
+        results[target] = {
+            'path': path,
+            'size_bytes': os.path.getsize(path),
+            'parity': parity,
+            **timing
+        }
+        status = '✅' if parity['passed'] else '❌'
+        print(f"  {status} {target:<16} load {timing['load_ms']:8.2f} ms  "
+              f"latency {timing['latency_ms']:8.2f} ms  max diff {parity['max_abs_diff']:.2e}")
+
+    valid = {target: r for target, r in results.items() if r.get('parity', {}).get('passed')}
+    fastest = min(valid, key=lambda target: valid[target]['latency_ms']) if valid else None
+    if fastest:
+        print(f"  🏆 Fastest format with parity: {fastest}")
+    else:
+        print("  ⚠️  No artifact passed the parity check")
+
+    return {'input_size': list(model['input_size']), 'targets': results, 'fastest': fastest}
 
 def main():
     """Main conversion function"""
-    print("🔄 Converting TFLite models to TensorFlow.js format...")
-    
-    # Define model paths
-    models = [
-        {
-            "tflite_path": "android/app/src/main/assets/models/stage1_nonleaf.tflite",
-            "output_dir": "assets/models/tfjs/stage1_nonleaf"
-        },
-        {
-            "tflite_path": "android/app/src/main/assets/models/stage2_Tea_disease.tflite", 
-            "output_dir": "assets/models/tfjs/stage2_Tea_disease"
-        }
-    ]
-    
-    for model in models:
-        if os.path.exists(model["tflite_path"]):
-            convert_tflite_to_tfjs(model["tflite_path"], model["output_dir"])
+    parser = argparse.ArgumentParser(description='Convert and validate TeaLeafNet models')
+    parser.add_argument('--targets', nargs='+', default=DEFAULT_TARGETS, choices=sorted(CONVERTERS),
+                        help='Formats to export')
+    parser.add_argument('--output-dir', default='converted_models', help='Where to write artifacts')
+    parser.add_argument('--samples', type=int, default=8, help='Sample inputs for the parity check')
+    parser.add_argument('--atol', type=float, default=1e-4, help='Largest allowed output difference')
+    parser.add_argument('--runs', type=int, default=20, help='Timed inferences per artifact')
+    parser.add_argument('--warmup', type=int, default=3, help='Warm-up inferences per artifact')
+    parser.add_argument('--report', default='conversion_report.json', help='JSON report path')
+    args = parser.parse_args()
+
+    print("🔄 Converting TFLite models...")
+    report = {}
+
+    for model in STAGE_MODELS:
+        if os.path.exists(model['tflite_path']):
+            report[model['name']] = convert_model(model, args.targets, args.output_dir, args)
         else:
             print(f"⚠️  Model not found: {model['tflite_path']}")
-    
-    print("\n📝 Next steps:")
-    print("1. Install tensorflowjs: pip install tensorflowjs")
-    print("2. Run this script: python convert_models.py")
-    print("3. Update ModelService.ts to load the converted models")
-    print("4. Test the app with real TensorFlow.js models!")
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n📋 Report written to {args.report}")
+    if any(not r['fastest'] for r in report.values()):
+        raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
@@ -3,45 +3,38 @@
 Convert TensorFlow Lite models to ONNX format for Hugging Face
 """
 
-import tensorflow as tf
-import tf2onnx
-import onnx
-import numpy as np
 import os
 
+from convert_models import convert_to_onnx, TFLiteRunner, sample_inputs, check_parity, benchmark_artifact
+
 def convert_tflite_to_onnx(tflite_path, onnx_path, input_shape):
     """
-    Convert TensorFlow Lite model to ONNX format
+    Convert TensorFlow Lite model to ONNX format and validate it against the original
     """
     print(f"Converting {tflite_path} to {onnx_path}...")
     
-    # Load TFLite model
-    interpreter = tf.lite.Interpreter(model_path=tflite_path)
-    interpreter.allocate_tensors()
-    
-    # Get input and output details
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
-    
-    print(f"Input shape: {input_details[0]['shape']}")
-    print(f"Output shape: {output_details[0]['shape']}")
-    
-    # Create a dummy input for conversion
-    dummy_input = np.random.randn(1, *input_shape).astype(np.float32)
-    
-    # Convert to ONNX
     try:
-        # This is a simplified conversion - you might need to adjust based on your model
-        onnx_model = tf2onnx.convert.from_tflite(
-            tflite_path,
-            inputs_as_nchw=['input'],  # Adjust based on your model
-            output_path=onnx_path
-        )
-        print(f"✅ Successfully converted to {onnx_path}")
-        return True
+        converted_path, runner_class = convert_to_onnx(tflite_path, os.path.dirname(onnx_path) or '.')
+        os.replace(converted_path, onnx_path)
+        
+        # Check the ONNX outputs match the TFLite model on sample inputs
+        inputs = sample_inputs(input_shape[:2], count=8)
+        runner, timing = benchmark_artifact(runner_class, onnx_path, inputs[0], runs=10, warmup=2)
+        parity = check_parity(TFLiteRunner(tflite_path), runner, inputs, atol=1e-4)
     except Exception as e:
         print(f"❌ Conversion failed: {e}")
         return False
+    
+    print(f"Max output difference: {parity['max_abs_diff']:.2e}, "
+          f"top-1 agreement: {parity['argmax_agreement'] * 100:.0f}%")
+    print(f"Load time: {timing['load_ms']:.1f} ms, latency: {timing['latency_ms']:.2f} ms")
+    
+    if not parity['passed']:
+        print(f"❌ {onnx_path} does not match {tflite_path}, don't upload it")
+        return False
+    
+    print(f"✅ Successfully converted to {onnx_path}")
+    return True
 
 def create_model_card(model_name, description, input_shape, output_classes):
     """
@@ -110,14 +103,14 @@ This model was trained on tea leaf disease dataset.
 
 if __name__ == "__main__":
     # Convert Stage 1: Leaf Detection
-    convert_tflite_to_onnx(
+    leaf_ok = convert_tflite_to_onnx(
         "stage1_nonleaf.tflite",
         "leaf_detection.onnx",
         [160, 160, 3]  # Adjust based on your model
     )
     
     # Convert Stage 2: Disease Classification
-    convert_tflite_to_onnx(
+    disease_ok = convert_tflite_to_onnx(
         "stage2_Tea_disease.tflite",
         "disease_classification.onnx",
         [512, 512, 3]  # Adjust based on your model
@@ -138,8 +131,12 @@ if __name__ == "__main__":
         ["bb", "gl", "rr", "rsm"]
     )
     
+    if not (leaf_ok and disease_ok):
+        print("\n❌ Conversion failed validation, see the errors above")
+        raise SystemExit(1)
+    
     print("\n🎉 Conversion complete!")
     print("Next steps:")
-    print("1. Install required packages: pip install tensorflow tf2onnx onnx")
+    print("1. Install required packages: pip install tensorflow tf2onnx onnx onnxruntime")
     print("2. Run this script: python convert_models_for_hf.py")
     print("3. Upload the .onnx files to Hugging Face")
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+TeaLeafNet coordinator
+Spreads /analyze and batch requests over several inference nodes, routing
+each request to the least-loaded healthy node and retrying failures on
+other nodes. Load is the requests this coordinator has in flight to a node
+plus the other requests that node reports on /metrics.
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import Flask, Response, request, jsonify
+from requests.adapters import HTTPAdapter
+
+class Node:
+    """One inference server and what the coordinator knows about it"""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.healthy = False
+        self.queue_depth = 0  # node's reported in-flight requests, less ours at that moment
+        self.in_flight = 0  # requests this coordinator is waiting on
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_checked = None
+
+    def load(self):
+        return self.queue_depth + self.in_flight
+
+    def snapshot(self):
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'queue_depth': self.queue_depth,
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'failures': self.failures,
+            'last_checked': self.last_checked
+        }
+
+class NoHealthyNodeError(Exception):
+    """Raised when no node is left to try"""
+
+class ShardRejectedError(Exception):
+    """Raised when a node refuses a batch shard with a client error"""
+
+    def __init__(self, response):
+        super().__init__(f'{response.url} returned {response.status_code}')
+        self.response = response
+
+class Coordinator:
+    """Routes requests to the least-loaded healthy node"""
+
+    def __init__(self, node_urls, poll_interval=2.0, max_attempts=3, failure_threshold=3,
+                 shard_size=8, timeout=120, max_connections=32):
+        self.nodes = [Node(url) for url in node_urls]
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.failure_threshold = failure_threshold
+        self.shard_size = shard_size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+        # Keep-alive connections to every node
+        adapter = HTTPAdapter(pool_connections=len(self.nodes), pool_maxsize=max_connections)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def check_node(self, node):
+        """Refresh a node's health and queue depth"""
+        try:
+            health = self.session.get(f'{node.url}/health', timeout=5)
+            healthy = health.ok and health.json().get('status') == 'healthy'
+            queue_depth = 0
+            if healthy:
+                metrics = self.session.get(f'{node.url}/metrics', timeout=5)
+                if metrics.ok:
+                    queue_depth = int(metrics.json().get('in_flight', 0))
+        except (requests.RequestException, ValueError):
+            healthy = False
+            queue_depth = 0
+
+        with self.lock:
+            node.healthy = healthy
+            # The node's count includes our own requests, which load() adds separately
+            node.queue_depth = max(0, queue_depth - node.in_flight)
+            node.last_checked = time.time()
+            if healthy:
+                node.consecutive_failures = 0
+
+    def check_all(self):
+        for node in self.nodes:
+            self.check_node(node)
+
+    def start_polling(self):
+        """Poll node health in the background"""
+        def poll():
+            while not self.stopped.wait(self.poll_interval):
+                self.check_all()
+
+        self.check_all()
+        threading.Thread(target=poll, daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def acquire(self, exclude=()):
+        """Pick the least-loaded healthy node and count the request against it"""
+        with self.lock:
+            candidates = [node for node in self.nodes if node.healthy and node not in exclude]
+            if not candidates:
+                raise NoHealthyNodeError('No healthy inference node available')
+            # Ties go to the node that has served fewer requests
+            node = min(candidates, key=lambda node: (node.load(), node.requests))
+            node.in_flight += 1
+            node.requests += 1
+            return node
+
+    def release(self, node, ok):
+        with self.lock:
+            node.in_flight -= 1
+            if ok:
+                node.consecutive_failures = 0
+                return
+            node.failures += 1
+            node.consecutive_failures += 1
+            if node.consecutive_failures >= self.failure_threshold:
+                node.healthy = False
+                print(f"⚠️  Node {node.url} marked unhealthy after {node.consecutive_failures} failures")
+
+    def forward(self, method, path, **kwargs):
+        """Send a request to the best node, retrying failures on other nodes"""
+        tried = []
+        last_error = None
+
+        for _ in range(min(self.max_attempts, len(self.nodes))):
+            try:
+                node = self.acquire(exclude=tried)
+            except NoHealthyNodeError:
+                break
+            tried.append(node)
+
+            try:
+                response = self.session.request(method, f'{node.url}{path}', timeout=self.timeout, **kwargs)
+            except requests.RequestException as e:
+                # Connection problems mean the node is gone until the next health check
+                self.release(node, ok=False)
+                with self.lock:
+                    node.healthy = False
+                last_error = str(e)
+                continue
+
+            # Client errors are the caller's problem, not the node's
+            if response.status_code < 500:
+                self.release(node, ok=True)
+                return response
+
+            self.release(node, ok=False)
+            last_error = f'{node.url} returned {response.status_code}'
+
+        raise NoHealthyNodeError(last_error or 'No healthy inference node available')
+
+    def analyze_batch(self, images, model=None):
+        """Split a batch into shards, spread them over nodes and merge the results"""
+        healthy = sum(1 for node in self.nodes if node.healthy) or 1
+        # Enough shards to use every healthy node, none bigger than shard_size
+        shard_size = max(1, min(self.shard_size, -(-len(images) // healthy)))
+        shards = [images[i:i + shard_size] for i in range(0, len(images), shard_size)]
+
+        def run_shard(shard):
+            payload = {'images': shard}
+            if model:
+                payload['model'] = model
+            response = self.forward('POST', '/analyze/batch', json=payload)
+            if response.status_code >= 400:
+                # forward() already retried server errors, so this is the caller's problem
+                raise ShardRejectedError(response)
+            return response.json()['results']
+
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            shard_results = list(executor.map(run_shard, shards))
+
+        return [result for results in shard_results for result in results]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'nodes': [node.snapshot() for node in self.nodes],
+                'healthy_nodes': sum(1 for node in self.nodes if node.healthy),
+                'in_flight': sum(node.in_flight for node in self.nodes),
+                'queue_depth': sum(node.queue_depth for node in self.nodes)
+            }
+
+def passthrough(response):
+    """Return a node's response unchanged"""
+    return Response(response.content, status=response.status_code,
+                    content_type=response.headers.get('Content-Type', 'application/json'))
+
+def create_app(coordinator):
+    """Flask app exposing the same API as a single inference node"""
+    app = Flask(__name__)
+
+    @app.route('/health', methods=['GET'])
+    def health_check():
+        stats = coordinator.stats()
+        return jsonify({
+            'status': 'healthy' if stats['healthy_nodes'] else 'unhealthy',
+            'service': 'TeaLeafNet coordinator',
+            'healthy_nodes': stats['healthy_nodes'],
+            'models_loaded': stats['healthy_nodes'] > 0
+        }), 200 if stats['healthy_nodes'] else 503
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        return jsonify(coordinator.stats())
+
+    @app.route('/test', methods=['GET'])
+    def test_endpoint():
+        return jsonify({
+            'message': 'TeaLeafNet coordinator is running!',
+            'endpoints': ['/health', '/analyze', '/analyze/binary', '/analyze/batch', '/metrics', '/test'],
+            'status': 'ready'
+        })
+
+    @app.route('/analyze', methods=['POST'])
+    def analyze_image():
+        try:
+            response = coordinator.forward('POST', '/analyze', data=request.get_data(),
+                                           headers={'Content-Type': 'application/json'})
+            return passthrough(response)
+        except NoHealthyNodeError as e:
+            return jsonify({'error': str(e)}), 503
+
+    @app.route('/analyze/binary', methods=['POST'])
+    def analyze_binary():
+        try:
+            response = coordinator.forward('POST', '/analyze/binary', data=request.get_data(),
+                                           params=request.args,
+                                           headers={'Content-Type': 'application/octet-stream'})
+            return passthrough(response)
+        except NoHealthyNodeError as e:
+            return jsonify({'error': str(e)}), 503
+
+    @app.route('/analyze/batch', methods=['POST'])
+    def analyze_batch():
+        data = request.get_json()
+        if not data or not data.get('images'):
+            return jsonify({'error': 'No images provided'}), 400
+
+        try:
+            return jsonify({'results': coordinator.analyze_batch(data['images'], data.get('model'))})
+        except ShardRejectedError as e:
+            return passthrough(e.response)
+        except NoHealthyNodeError as e:
+            return jsonify({'error': str(e)}), 503
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description='Coordinate several TeaLeafNet inference nodes')
+    parser.add_argument('--nodes', nargs='+', required=True, help='Base URLs of the inference nodes')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between health checks')
+    parser.add_argument('--max-attempts', type=int, default=3, help='Nodes to try per request')
+    parser.add_argument('--shard-size', type=int, default=8, help='Largest batch shard sent to one node')
+    args = parser.parse_args()
+
+    coordinator = Coordinator(args.nodes, poll_interval=args.poll_interval,
+                              max_attempts=args.max_attempts, shard_size=args.shard_size)
+    coordinator.start_polling()
+
+    stats = coordinator.stats()
+    print(f"\n🎛️  TeaLeafNet coordinator: {stats['healthy_nodes']}/{len(args.nodes)} nodes healthy")
+    for node in stats['nodes']:
+        print(f"  {'✅' if node['healthy'] else '❌'} {node['url']}")
+
+    print(f"\n🚀 Coordinator listening on http://{args.host}:{args.port}")
+    create_app(coordinator).run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == '__main__':
+    main()
@@ -18,33 +18,394 @@ import requests
 import os
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import subprocess
 import threading
 import time
+import json
+import queue
+import shutil
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-class TeaLeafModel:
+# Default Hugging Face locations of the stage models
+DEFAULT_MODEL_URLS = {
+    'leaf_detection.tflite': 'https://huggingface.co/kd8811/TeaLeafNet/resolve/main/leaf_detection.tflite',
+    'disease_classification.tflite': 'https://huggingface.co/kd8811/TeaLeafNet/resolve/main/disease_classification.tflite'
+}
+
+DEFAULT_LEAF_MODEL_PATH = 'models/leaf_detection.tflite'
+DEFAULT_DISEASE_MODEL_PATH = 'models/disease_classification.tflite'
+
+# Model registry configuration (JSON file mapping model ids to model specs)
+MODEL_REGISTRY_PATH = os.environ.get('TEALEAF_MODEL_REGISTRY', 'model_registry.json')
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get('TEALEAF_MODEL_MEMORY_MB', '1024'))
+DEFAULT_MODEL_ID = 'default'
+
+# Stage 2 inference resolution (pick a point from resolution_sweep.py)
+STAGE2_RESOLUTION = int(os.environ.get('TEALEAF_STAGE2_RESOLUTION', '512'))
+
+# Host-specific interpreter settings written by autotune.py
+TUNING_PATH = os.environ.get('TEALEAF_TUNING_PATH', 'tealeaf_tuning.json')
+DEFAULT_STAGE_SETTINGS = {'num_threads': None, 'xnnpack': True, 'pool_size': 1}
+
+# Request memory limits
+MAX_BODY_MB = float(os.environ.get('TEALEAF_MAX_BODY_MB', '20'))
+MAX_IMAGE_PIXELS = int(os.environ.get('TEALEAF_MAX_IMAGE_PIXELS', str(50_000_000)))
+MAX_CONCURRENT_IMAGES = int(os.environ.get('TEALEAF_MAX_CONCURRENT_IMAGES', '4'))
+DECODE_CHUNK_CHARS = 64 * 1024  # multiple of 4 so every chunk decodes on its own
+MAX_BATCH_IMAGES = int(os.environ.get('TEALEAF_MAX_BATCH_IMAGES', '32'))
+
+# Image quality pre-filter (off, flag or reject) and its thresholds
+QUALITY_FILTER_MODE = os.environ.get('TEALEAF_QUALITY_FILTER', 'off')
+QUALITY_THRESHOLDS = {
+    'min_sharpness': float(os.environ.get('TEALEAF_MIN_SHARPNESS', '30')),
+    'min_brightness': float(os.environ.get('TEALEAF_MIN_BRIGHTNESS', '40')),
+    'max_brightness': float(os.environ.get('TEALEAF_MAX_BRIGHTNESS', '220')),
+    'max_clipped': float(os.environ.get('TEALEAF_MAX_CLIPPED', '0.4')),
+    'min_green_ratio': float(os.environ.get('TEALEAF_MIN_GREEN_RATIO', '0.15'))
+}
+QUALITY_SAMPLE_SIZE = 256  # longest side of the copy the metrics are computed on
+# Reasons that are only flagged, never rejected: rust and blight turn leaves red or brown
+ADVISORY_QUALITY_REASONS = ('not_plant',)
+
+# Refuse decompression bombs before Pillow allocates them
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured pixel limit"""
+
+class UnsupportedInputSizeError(ValueError):
+    """Raised when a model can't run at the requested input size"""
+
+def current_rss_bytes():
+    """Resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Not Linux: fall back to the peak, which is the best we have
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class RequestMemoryStats:
+    """Tracks the intermediates one request holds and its peak"""
+    
     def __init__(self):
+        self.held = {}
+        self.peak_bytes = 0
+        self.rss_start = current_rss_bytes()
+        self.rss_peak = self.rss_start
+    
+    def hold(self, name, nbytes):
+        """Record an intermediate buffer"""
+        self.held[name] = int(nbytes)
+        self.peak_bytes = max(self.peak_bytes, sum(self.held.values()))
+        self.rss_peak = max(self.rss_peak, current_rss_bytes())
+    
+    def release(self, name):
+        """Record that an intermediate buffer was dropped"""
+        self.held.pop(name, None)
+    
+    def summary(self):
+        """Per-request memory figures in MB"""
+        return {
+            'peak_held_mb': round(self.peak_bytes / (1024 * 1024), 3),
+            'rss_start_mb': round(self.rss_start / (1024 * 1024), 2),
+            'rss_peak_mb': round(self.rss_peak / (1024 * 1024), 2)
+        }
+
+class ServerMetrics:
+    """Request counters and memory figures for the /metrics endpoint"""
+    
+    def __init__(self, worker_in_flight=None, worker_slot=0):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.rejected = 0
+        # Pre-forked workers each publish their in-flight count in one slot of a shared array
+        self.worker_in_flight = worker_in_flight
+        self.worker_slot = worker_slot
+        self.max_request_held_mb = 0.0
+        self.total_request_held_mb = 0.0
+        self.measured = 0  # requests that reported memory stats
+    
+    def start(self):
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.publish_in_flight()
+    
+    def finish(self, memory=None):
+        with self.lock:
+            self.in_flight -= 1
+            self.publish_in_flight()
+            if memory is not None:
+                held_mb = memory.summary()['peak_held_mb']
+                self.max_request_held_mb = max(self.max_request_held_mb, held_mb)
+                self.total_request_held_mb += held_mb
+                self.measured += 1
+    
+    def publish_in_flight(self):
+        if self.worker_in_flight is not None:
+            self.worker_in_flight[self.worker_slot] = self.in_flight
+    
+    def reject(self):
+        with self.lock:
+            self.rejected += 1
+    
+    def snapshot(self):
+        with self.lock:
+            # Any worker answers /metrics, so report the whole server's count, not just its own
+            in_flight = sum(self.worker_in_flight[:]) if self.worker_in_flight is not None else self.in_flight
+            return {
+                'pid': os.getpid(),
+                'requests': self.requests,
+                'in_flight': in_flight,
+                'worker_in_flight': self.in_flight,
+                'rejected': self.rejected,
+                'rss_mb': round(current_rss_bytes() / (1024 * 1024), 2),
+                'max_request_held_mb': round(self.max_request_held_mb, 3),
+                'avg_request_held_mb': round(self.total_request_held_mb / self.measured, 3) if self.measured else 0.0
+            }
+
+class QualityFilter:
+    """Cheap blur, exposure and greenness checks run before the models"""
+    
+    def __init__(self, mode=QUALITY_FILTER_MODE, thresholds=None, sample_size=QUALITY_SAMPLE_SIZE):
+        if mode not in ('off', 'flag', 'reject'):
+            raise ValueError(f"Unknown quality filter mode: {mode}")
+        self.mode = mode
+        self.thresholds = dict(QUALITY_THRESHOLDS, **(thresholds or {}))
+        self.sample_size = sample_size
+        self.lock = threading.Lock()
+        self.checked = 0
+        self.failed = 0
+        self.skipped = 0
+        self.failures_by_reason = {}
+        self.filter_ms = 0.0
+        self.stage1_ms = 0.0
+        self.stage1_runs = 0
+        self.stage2_ms = 0.0
+        self.stage2_runs = 0
+    
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+    
+    def compute_metrics(self, image):
+        """Blur, exposure and green-ratio metrics on a downscaled copy"""
+        scale = min(1.0, self.sample_size / max(image.size))
+        small = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                             Image.BILINEAR, reducing_gap=2.0)
+        pixels = np.asarray(small, dtype=np.float32)
+        gray = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        
+        # Variance of the 4-neighbour Laplacian: low means few edges, i.e. blur
+        laplacian = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+                     - 4 * gray[1:-1, 1:-1])
+        # Share of pixels where green clearly dominates (excess green index 2G - R - B)
+        excess_green = 2 * pixels[..., 1] - pixels[..., 0] - pixels[..., 2]
+        
+        return {
+            'sharpness': float(laplacian.var()) if laplacian.size else 0.0,
+            'brightness': float(gray.mean()),
+            'clipped': float(((gray < 8) | (gray > 247)).mean()),
+            'green_ratio': float((excess_green > 10).mean())
+        }
+    
+    def check(self, image):
+        """Run the checks and return the metrics with any failure reasons"""
+        start = time.perf_counter()
+        metrics = self.compute_metrics(image)
+        t = self.thresholds
+        
+        reasons = []
+        if metrics['sharpness'] < t['min_sharpness']:
+            reasons.append('blurry')
+        if metrics['brightness'] < t['min_brightness']:
+            reasons.append('underexposed')
+        if metrics['brightness'] > t['max_brightness']:
+            reasons.append('overexposed')
+        if metrics['clipped'] > t['max_clipped']:
+            reasons.append('clipped')
+        if metrics['green_ratio'] < t['min_green_ratio']:
+            reasons.append('not_plant')
+        
+        with self.lock:
+            self.checked += 1
+            self.filter_ms += (time.perf_counter() - start) * 1000
+            if reasons:
+                self.failed += 1
+                for reason in reasons:
+                    self.failures_by_reason[reason] = self.failures_by_reason.get(reason, 0) + 1
+        
+        return {
+            'passed': not reasons,
+            'reasons': reasons,
+            'metrics': {key: round(value, 4) for key, value in metrics.items()}
+        }
+    
+    def should_reject(self, quality):
+        """Whether a failed check skips inference (advisory reasons alone never do)"""
+        return self.mode == 'reject' and any(
+            reason not in ADVISORY_QUALITY_REASONS for reason in quality['reasons'])
+    
+    def record_skip(self):
+        """Count an image whose inference was skipped"""
+        with self.lock:
+            self.skipped += 1
+    
+    def record_inference(self, stage1_ms, stage2_ms=None):
+        """Track stage timings to estimate what skipped images would have cost"""
+        with self.lock:
+            self.stage1_ms += stage1_ms
+            self.stage1_runs += 1
+            if stage2_ms is not None:
+                self.stage2_ms += stage2_ms
+                self.stage2_runs += 1
+    
+    def stats(self):
+        """Filter counters and the inference time it saved"""
+        with self.lock:
+            avg_stage1 = self.stage1_ms / self.stage1_runs if self.stage1_runs else 0.0
+            avg_stage2 = self.stage2_ms / self.stage2_runs if self.stage2_runs else 0.0
+            leaf_rate = self.stage2_runs / self.stage1_runs if self.stage1_runs else 0.0
+            saved_ms = self.skipped * (avg_stage1 + leaf_rate * avg_stage2)
+            
+            return {
+                'mode': self.mode,
+                'checked': self.checked,
+                'failed': self.failed,
+                'skipped': self.skipped,
+                'failures_by_reason': dict(self.failures_by_reason),
+                'filter_ms_total': round(self.filter_ms, 2),
+                'estimated_inference_saved_ms': round(saved_ms, 2),
+                'estimated_net_saved_ms': round(saved_ms - self.filter_ms, 2)
+            }
+
+def load_tuning(tuning_path=TUNING_PATH):
+    """Load per-stage interpreter settings, falling back to defaults"""
+    tuning = {'stage1': dict(DEFAULT_STAGE_SETTINGS), 'stage2': dict(DEFAULT_STAGE_SETTINGS)}
+    if os.path.exists(tuning_path):
+        with open(tuning_path) as f:
+            config = json.load(f)
+        for stage in tuning:
+            tuning[stage].update({key: value for key, value in config.get(stage, {}).items()
+                                  if key in DEFAULT_STAGE_SETTINGS})
+        print(f"⚙️  Loaded tuned settings from {tuning_path}")
+    return tuning
+
+def download_models(model_urls, models_dir='models'):
+    """Download TFLite models that are not present yet"""
+    os.makedirs(models_dir, exist_ok=True)
+    
+    for filename, url in model_urls.items():
+        if not os.path.exists(f'{models_dir}/{filename}'):
+            print(f"Downloading {filename}...")
+            response = requests.get(url)
+            response.raise_for_status()
+            with open(f'{models_dir}/{filename}', 'wb') as f:
+                f.write(response.content)
+            print(f"✅ {filename} downloaded successfully!")
+
+def open_image(buffer, draft_size, memory=None):
+    """Decode an encoded image file object, letting the decoder downscale towards draft_size"""
+    memory = memory or RequestMemoryStats()
+    memory.hold('encoded', buffer.getbuffer().nbytes)
+    
+    # Only the header is read here, so oversized images are refused before decoding.
+    # Pillow itself refuses images over twice its limit, which is the same error here.
+    try:
+        image = Image.open(buffer)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(f"Image has {width * height} pixels, limit is {MAX_IMAGE_PIXELS}")
+    
+    # JPEG can decode at 1/2, 1/4 or 1/8 scale while staying above the model inputs
+    image.draft('RGB', draft_size)
+    image = image.convert('RGB')
+    buffer.close()
+    memory.release('encoded')
+    memory.hold('image', image.width * image.height * 3)
+    
+    return image
+
+def image_to_tensor(image, target_size):
+    """Resize and normalize a decoded image into a batch of one"""
+    # Resize image
+    image = image.resize(target_size)
+    
+    # Convert to numpy array and normalize in place
+    image_array = np.asarray(image, dtype=np.float32)
+    image_array /= 255.0
+    
+    # Add batch dimension
+    return np.expand_dims(image_array, axis=0)
+
+def resize_input(interpreter, input_size):
+    """Resize an interpreter's input to input_size (width, height) and allocate its tensors"""
+    input_details = interpreter.get_input_details()[0]
+    height, width = input_size[1], input_size[0]
+    if tuple(input_details['shape'][1:3]) == (height, width):
+        interpreter.allocate_tensors()
+        return
+    
+    # Keras exports record their build size in the signature ([-1, 512, 512, 3]) even when
+    # every op could run at another size, so the resize isn't strict and a trial run decides
+    new_shape = [1, height, width, int(input_details['shape'][3])]
+    output_shapes = [tuple(detail['shape']) for detail in interpreter.get_output_details()]
+    try:
+        interpreter.resize_tensor_input(input_details['index'], new_shape)
+        interpreter.allocate_tensors()
+        interpreter.set_tensor(input_details['index'], np.zeros(new_shape, dtype=input_details['dtype']))
+        interpreter.invoke()
+    except (ValueError, RuntimeError) as e:
+        raise UnsupportedInputSizeError(f"Model does not accept {width}x{height} input: {e}") from e
+    
+    if [tuple(detail['shape']) for detail in interpreter.get_output_details()] != output_shapes:
+        raise UnsupportedInputSizeError(f"Model output changes shape at {width}x{height} input")
+
+class TeaLeafModel:
+    def __init__(self, leaf_model_path=DEFAULT_LEAF_MODEL_PATH,
+                 disease_model_path=DEFAULT_DISEASE_MODEL_PATH,
+                 disease_classes=None, leaf_input_size=(160, 160),
+                 disease_input_size=(STAGE2_RESOLUTION, STAGE2_RESOLUTION), model_urls=None,
+                 tuning=None, model_buffers=None, quality_filter=None):
         self.leaf_interpreter = None
         self.disease_interpreter = None
-        self.disease_classes = ['bb', 'gl', 'rr', 'rsm']
+        self.leaf_pool = queue.Queue()
+        self.disease_pool = queue.Queue()
+        self.leaf_model_path = leaf_model_path
+        self.disease_model_path = disease_model_path
+        self.disease_classes = disease_classes or ['bb', 'gl', 'rr', 'rsm']
+        self.leaf_input_size = tuple(leaf_input_size)
+        self.disease_input_size = tuple(disease_input_size)
+        self.model_urls = DEFAULT_MODEL_URLS if model_urls is None else model_urls
+        self.tuning = tuning or load_tuning()
+        self.model_buffers = model_buffers or {}  # model path -> bytes already in memory
+        self.quality_filter = quality_filter or default_quality_filter
         self.load_models()
     
     def load_models(self):
         """Load TFLite models"""
         try:
-            # Create models directory
-            os.makedirs('models', exist_ok=True)
-            
             # Download models from Hugging Face
             self.download_models()
             
-            # Load leaf detection model
-            self.leaf_interpreter = tf.lite.Interpreter(model_path='models/leaf_detection.tflite')
-            self.leaf_interpreter.allocate_tensors()
+            # Load leaf detection model (one interpreter per concurrent request)
+            for _ in range(self.tuning['stage1']['pool_size']):
+                self.leaf_pool.put(self.load_interpreter(
+                    self.leaf_model_path, self.leaf_input_size, self.tuning['stage1']))
+            self.leaf_interpreter = self.leaf_pool.queue[0]
             
             # Load disease classification model
-            self.disease_interpreter = tf.lite.Interpreter(model_path='models/disease_classification.tflite')
-            self.disease_interpreter.allocate_tensors()
+            for _ in range(self.tuning['stage2']['pool_size']):
+                self.disease_pool.put(self.load_interpreter(
+                    self.disease_model_path, self.disease_input_size, self.tuning['stage2']))
+            self.disease_interpreter = self.disease_pool.queue[0]
             
             print("✅ TFLite models loaded successfully!")
             self.print_model_info()
@@ -55,18 +416,46 @@ class TeaLeafModel:
     
     def download_models(self):
         """Download TFLite models from Hugging Face"""
-        models = {
-            'leaf_detection.tflite': 'https://huggingface.co/kd8811/TeaLeafNet/resolve/main/leaf_detection.tflite',
-            'disease_classification.tflite': 'https://huggingface.co/kd8811/TeaLeafNet/resolve/main/disease_classification.tflite'
-        }
+        download_models(self.model_urls)
+    
+    def load_interpreter(self, model_path, input_size, settings=DEFAULT_STAGE_SETTINGS):
+        """Create an interpreter, resizing its input to the configured resolution"""
+        options = {'num_threads': settings['num_threads']}
+        if not settings['xnnpack']:
+            options['experimental_op_resolver_type'] = \
+                tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
         
-        for filename, url in models.items():
-            if not os.path.exists(f'models/{filename}'):
-                print(f"Downloading {filename}...")
-                response = requests.get(url)
-                with open(f'models/{filename}', 'wb') as f:
-                    f.write(response.content)
-                print(f"✅ {filename} downloaded successfully!")
+        if model_path in self.model_buffers:
+            # Shares the caller's buffer instead of reading the file again
+            interpreter = tf.lite.Interpreter(model_content=self.model_buffers[model_path], **options)
+        else:
+            interpreter = tf.lite.Interpreter(model_path=model_path, **options)
+        input_details = interpreter.get_input_details()[0]
+        
+        if tuple(input_details['shape'][1:3]) != (input_size[1], input_size[0]):
+            print(f"📐 Resizing {model_path} input to {input_size[0]}x{input_size[1]}")
+        resize_input(interpreter, input_size)
+        return interpreter
+    
+    def memory_footprint(self):
+        """Estimate resident memory of the loaded models in bytes"""
+        total = 0
+        for path, pool in ((self.leaf_model_path, self.leaf_pool),
+                           (self.disease_model_path, self.disease_pool)):
+            # The flatbuffer (weights included) is held once per model
+            total += os.path.getsize(path)
+            
+            # Each interpreter adds its own arena: the input and every op output.
+            # Constant tensors live in the flatbuffer counted above.
+            for interpreter in list(pool.queue):
+                arena = {detail['index'] for detail in interpreter.get_input_details()}
+                for op in interpreter._get_ops_details():
+                    arena.update(int(index) for index in op['outputs'])
+                for tensor in interpreter.get_tensor_details():
+                    if tensor['index'] in arena:
+                        total += int(np.prod(tensor['shape'])) * np.dtype(tensor['dtype']).itemsize
+        
+        return total
     
     def print_model_info(self):
         """Print model input/output details"""
@@ -82,40 +471,62 @@ class TeaLeafModel:
         disease_output = self.disease_interpreter.get_output_details()[0]
         print(f"Disease Classification - Input: {disease_input['shape']}, Output: {disease_output['shape']}")
     
-    def preprocess_image(self, image_base64, target_size):
+    def decode_image(self, image_base64, memory=None):
+        """Decode a base64 image in chunks, letting the decoder downscale where possible"""
+        memory = memory or RequestMemoryStats()
+        
+        # Any whitespace (line wrapping, tabs) would break the 4-character alignment of the chunks
+        image_base64 = ''.join(image_base64.split())
+        
+        buffer = io.BytesIO()
+        for start in range(0, len(image_base64), DECODE_CHUNK_CHARS):
+            buffer.write(base64.b64decode(image_base64[start:start + DECODE_CHUNK_CHARS]))
+        buffer.seek(0)
+        
+        return self.load_image(buffer, memory)
+    
+    def load_image(self, buffer, memory=None):
+        """Decode an encoded image file object, letting the decoder downscale where possible"""
+        return open_image(buffer, self.max_input_size(), memory)
+    
+    def max_input_size(self):
+        """Smallest (width, height) that covers both model inputs"""
+        return (max(self.leaf_input_size[0], self.disease_input_size[0]),
+                max(self.leaf_input_size[1], self.disease_input_size[1]))
+    
+    def preprocess_image(self, image, target_size):
         """Preprocess image for model input"""
         try:
-            # Decode base64 image
-            image_data = base64.b64decode(image_base64)
-            image = Image.open(io.BytesIO(image_data)).convert('RGB')
-            
-            # Resize image
-            image = image.resize(target_size)
-            
-            # Convert to numpy array and normalize
-            image_array = np.array(image, dtype=np.float32) / 255.0
+            # Accept base64 as well as an already decoded image
+            if isinstance(image, str):
+                image = self.decode_image(image)
             
-            # Add batch dimension
-            image_array = np.expand_dims(image_array, axis=0)
-            
-            return image_array
+            return image_to_tensor(image, target_size)
             
         except Exception as e:
             print(f"❌ Error preprocessing image: {e}")
             raise e
     
-    def detect_leaf(self, image_base64):
+    def detect_leaf(self, image, memory=None):
         """Stage 1: Detect if image contains a tea leaf"""
+        memory = memory or RequestMemoryStats()
         try:
-            # Preprocess image for leaf detection (160x160)
-            input_data = self.preprocess_image(image_base64, (160, 160))
-            
-            # Run inference
-            self.leaf_interpreter.set_tensor(self.leaf_interpreter.get_input_details()[0]['index'], input_data)
-            self.leaf_interpreter.invoke()
+            # Preprocess image for leaf detection (160x160 by default)
+            input_data = self.preprocess_image(image, self.leaf_input_size)
+            memory.hold('stage1_tensor', input_data.nbytes)
             
-            # Get output
-            output = self.leaf_interpreter.get_tensor(self.leaf_interpreter.get_output_details()[0]['index'])
+            # Run inference on a free interpreter from the pool
+            interpreter = self.leaf_pool.get()
+            try:
+                interpreter.set_tensor(interpreter.get_input_details()[0]['index'], input_data)
+                interpreter.invoke()
+                
+                # Get output
+                output = interpreter.get_tensor(interpreter.get_output_details()[0]['index'])
+            finally:
+                self.leaf_pool.put(interpreter)
+                del input_data
+                memory.release('stage1_tensor')
             
             # Process result (assuming output is probability of non-leaf)
             non_leaf_prob = float(output[0][0])
@@ -131,18 +542,26 @@ class TeaLeafModel:
             print(f"❌ Error in leaf detection: {e}")
             return {'isLeaf': False, 'confidence': 0.0}
     
-    def classify_disease(self, image_base64):
+    def classify_disease(self, image, memory=None):
         """Stage 2: Classify tea leaf disease"""
+        memory = memory or RequestMemoryStats()
         try:
-            # Preprocess image for disease classification (512x512)
-            input_data = self.preprocess_image(image_base64, (512, 512))
+            # Preprocess image for disease classification (512x512 by default)
+            input_data = self.preprocess_image(image, self.disease_input_size)
+            memory.hold('stage2_tensor', input_data.nbytes)
             
-            # Run inference
-            self.disease_interpreter.set_tensor(self.disease_interpreter.get_input_details()[0]['index'], input_data)
-            self.disease_interpreter.invoke()
-            
-            # Get output
-            output = self.disease_interpreter.get_tensor(self.disease_interpreter.get_output_details()[0]['index'])
+            # Run inference on a free interpreter from the pool
+            interpreter = self.disease_pool.get()
+            try:
+                interpreter.set_tensor(interpreter.get_input_details()[0]['index'], input_data)
+                interpreter.invoke()
+                
+                # Get output
+                output = interpreter.get_tensor(interpreter.get_output_details()[0]['index'])
+            finally:
+                self.disease_pool.put(interpreter)
+                del input_data
+                memory.release('stage2_tensor')
             
             # Process result
             probabilities = output[0]
@@ -157,30 +576,71 @@ class TeaLeafModel:
             
         except Exception as e:
             print(f"❌ Error in disease classification: {e}")
-            return {'class': 'bb', 'confidence': 0.0}
+            return {'class': self.disease_classes[0], 'confidence': 0.0}
     
-    def analyze_image(self, image_base64):
+    def analyze_image(self, image_base64, memory=None):
         """Complete analysis pipeline"""
+        memory = memory or RequestMemoryStats()
         try:
             print("🔍 Starting image analysis...")
             
+            # Decode once for both stages and drop the encoded upload straight away
+            if isinstance(image_base64, str):
+                image = self.decode_image(image_base64, memory)
+            elif isinstance(image_base64, io.BytesIO):
+                image = self.load_image(image_base64, memory)
+            else:
+                image = image_base64
+            del image_base64
+            memory.release('base64')
+            
+            # Optional quality gate: reject or flag bad photos before either model runs
+            quality = None
+            if self.quality_filter.enabled:
+                quality = self.quality_filter.check(image)
+                if not quality['passed']:
+                    print(f"Quality check failed: {', '.join(quality['reasons'])}")
+                    if self.quality_filter.should_reject(quality):
+                        self.quality_filter.record_skip()
+                        return {
+                            'isLeaf': False,
+                            'leafConfidence': 0.0,
+                            'diseaseClass': None,
+                            'diseaseConfidence': None,
+                            'quality': dict(quality, rejected=True)
+                        }
+            
             # Stage 1: Leaf Detection
-            leaf_result = self.detect_leaf(image_base64)
+            stage_start = time.perf_counter()
+            leaf_result = self.detect_leaf(image, memory)
+            stage1_ms = (time.perf_counter() - stage_start) * 1000
             print(f"Stage 1 - Leaf detected: {leaf_result['isLeaf']} (confidence: {leaf_result['confidence']:.3f})")
             
             disease_result = None
+            stage2_ms = None
             if leaf_result['isLeaf']:
                 # Stage 2: Disease Classification
-                disease_result = self.classify_disease(image_base64)
+                stage_start = time.perf_counter()
+                disease_result = self.classify_disease(image, memory)
+                stage2_ms = (time.perf_counter() - stage_start) * 1000
                 print(f"Stage 2 - Disease: {disease_result['class']} (confidence: {disease_result['confidence']:.3f})")
             
-            return {
+            self.quality_filter.record_inference(stage1_ms, stage2_ms)
+            del image
+            memory.release('image')
+            
+            result = {
                 'isLeaf': leaf_result['isLeaf'],
                 'leafConfidence': leaf_result['confidence'],
                 'diseaseClass': disease_result['class'] if disease_result else None,
                 'diseaseConfidence': disease_result['confidence'] if disease_result else None
             }
+            if quality is not None:
+                result['quality'] = dict(quality, rejected=False)
+            return result
             
+        except ImageTooLargeError:
+            raise
         except Exception as e:
             print(f"❌ Error in complete analysis: {e}")
             return {
@@ -190,13 +650,111 @@ class TeaLeafModel:
                 'diseaseConfidence': None
             }
 
+# Shared by every model so the savings stats cover the whole server
+default_quality_filter = QualityFilter()
+
+class ModelRegistry:
+    """Maps model ids to lazily loaded TeaLeafModel instances under a memory budget"""
+    
+    def __init__(self, specs, memory_budget_mb=MODEL_MEMORY_BUDGET_MB):
+        self.specs = specs
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.models = OrderedDict()  # model id -> TeaLeafModel, least recently used first
+        self.model_buffers = {}  # model path -> bytes, filled by prefork_server.py
+        self.footprints = {}
+        self.loading = {}  # model id -> Event set when its load finishes
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+    
+    @classmethod
+    def from_config(cls, config_path=MODEL_REGISTRY_PATH, memory_budget_mb=MODEL_MEMORY_BUDGET_MB):
+        """Build a registry from a JSON config, falling back to the default models"""
+        specs = {DEFAULT_MODEL_ID: {}}
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                specs.update(json.load(f))
+            print(f"📚 Loaded {len(specs)} model specs from {config_path}")
+        return cls(specs, memory_budget_mb)
+    
+    def get(self, model_id=None):
+        """Return the model for an id, loading it and evicting others if needed"""
+        model_id = model_id or DEFAULT_MODEL_ID
+        if model_id not in self.specs:
+            raise KeyError(f"Unknown model id: {model_id}")
+        
+        while True:
+            with self.lock:
+                if model_id in self.models:
+                    self.models.move_to_end(model_id)
+                    return self.models[model_id]
+                
+                loading = self.loading.get(model_id)
+                if loading is None:
+                    loading = self.loading[model_id] = threading.Event()
+                    break
+            
+            # Another request is loading this model; wait for it, then look again
+            loading.wait()
+        
+        # Load outside the lock so requests for already loaded models aren't blocked
+        try:
+            print(f"🤖 Loading model '{model_id}'...")
+            model = TeaLeafModel(model_buffers=self.model_buffers, **self.specs[model_id])
+            footprint = model.memory_footprint()
+            
+            with self.lock:
+                self.models[model_id] = model
+                self.footprints[model_id] = footprint
+                self.loads += 1
+                self.evict(keep=model_id)
+            return model
+        finally:
+            with self.lock:
+                del self.loading[model_id]
+            loading.set()
+    
+    def evict(self, keep=None):
+        """Evict least recently used models until the budget is met"""
+        while self.memory_used() > self.memory_budget:
+            victim = next((mid for mid in self.models if mid != keep), None)
+            if victim is None:
+                print(f"⚠️  Model '{keep}' alone exceeds the memory budget")
+                break
+            
+            # In-flight requests keep their reference until they finish
+            del self.models[victim]
+            del self.footprints[victim]
+            self.evictions += 1
+            print(f"♻️  Evicted model '{victim}'")
+    
+    def memory_used(self):
+        """Estimated bytes held by loaded models"""
+        return sum(self.footprints.values())
+    
+    def stats(self):
+        """Registry state for the API"""
+        with self.lock:
+            return {
+                'available': sorted(self.specs),
+                'loaded': list(self.models),
+                'memory_used_mb': round(self.memory_used() / (1024 * 1024), 2),
+                'memory_budget_mb': round(self.memory_budget / (1024 * 1024), 2),
+                'loads': self.loads,
+                'evictions': self.evictions
+            }
+
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+app.config['MAX_CONTENT_LENGTH'] = int(MAX_BODY_MB * 1024 * 1024)
 
-# Initialize the model
-print("🤖 Initializing TFLite models...")
-model = TeaLeafModel()
+# Bounds how many decoded images and tensors are alive at once
+image_slots = threading.BoundedSemaphore(MAX_CONCURRENT_IMAGES)
+metrics = ServerMetrics()
+
+# Initialize the model registry (models load on first use)
+registry = ModelRegistry.from_config()
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -204,35 +762,142 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'service': 'TeaLeafNet TFLite API',
-        'models_loaded': model.leaf_interpreter is not None and model.disease_interpreter is not None
+        'models_loaded': len(registry.models) > 0
     })
 
+@app.route('/models', methods=['GET'])
+def list_models():
+    """Model registry endpoint"""
+    return jsonify(registry.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Request and memory metrics endpoint"""
+    return jsonify(dict(metrics.snapshot(), quality_filter=default_quality_filter.stats()))
+
 @app.route('/analyze', methods=['POST'])
 def analyze_image():
     """Analyze tea leaf image"""
+    memory = None
+    metrics.start()
     try:
-        data = request.get_json()
+        # Don't cache the body or parsed JSON on the request, so both can be freed early
+        data = request.get_json(cache=False)
         
         if not data or 'image' not in data:
             return jsonify({'error': 'No image provided'}), 400
         
-        image_base64 = data['image']
+        try:
+            model = registry.get(data.get('model'))
+        except KeyError as e:
+            return jsonify({'error': str(e.args[0])}), 404
+        
+        memory = RequestMemoryStats()
+        memory.hold('base64', len(data['image']))
         
-        # Analyze image with TFLite models
-        result = model.analyze_image(image_base64)
+        # Analyze image with TFLite models (the pipeline holds the only reference to the base64 text)
+        with image_slots:
+            result = model.analyze_image(data.pop('image'), memory)
         
-        return jsonify(result)
+        response = jsonify(result)
+        response.headers['X-Peak-Memory-MB'] = str(memory.summary()['peak_held_mb'])
+        return response
         
+    except (RequestEntityTooLarge, ImageTooLargeError) as e:
+        metrics.reject()
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         print(f"❌ API Error: {e}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        metrics.finish(memory)
+
+@app.route('/analyze/binary', methods=['POST'])
+def analyze_binary():
+    """Analyze a tea leaf image sent as raw bytes (no base64 overhead)"""
+    memory = None
+    metrics.start()
+    try:
+        try:
+            model = registry.get(request.args.get('model'))
+        except KeyError as e:
+            return jsonify({'error': str(e.args[0])}), 404
+        
+        # Read the body in chunks; MAX_CONTENT_LENGTH still applies to the stream
+        buffer = io.BytesIO()
+        shutil.copyfileobj(request.stream, buffer, DECODE_CHUNK_CHARS)
+        if buffer.tell() == 0:
+            return jsonify({'error': 'No image provided'}), 400
+        buffer.seek(0)
+        
+        memory = RequestMemoryStats()
+        with image_slots:
+            result = model.analyze_image(buffer, memory)
+        
+        response = jsonify(result)
+        response.headers['X-Peak-Memory-MB'] = str(memory.summary()['peak_held_mb'])
+        return response
+        
+    except (RequestEntityTooLarge, ImageTooLargeError) as e:
+        metrics.reject()
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        print(f"❌ API Error: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        metrics.finish(memory)
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze several base64 images in one request"""
+    metrics.start()
+    try:
+        data = request.get_json(cache=False)
+        
+        if not data or not data.get('images'):
+            return jsonify({'error': 'No images provided'}), 400
+        if len(data['images']) > MAX_BATCH_IMAGES:
+            metrics.reject()
+            return jsonify({'error': f"Batch has {len(data['images'])} images, limit is {MAX_BATCH_IMAGES}"}), 413
+        
+        try:
+            model = registry.get(data.get('model'))
+        except KeyError as e:
+            return jsonify({'error': str(e.args[0])}), 404
+        
+        images = data.pop('images')
+        
+        def analyze_one(index):
+            # Drop each base64 string as soon as its image has been analyzed
+            image_base64, images[index] = images[index], None
+            with image_slots:
+                try:
+                    return model.analyze_image(image_base64)
+                except ImageTooLargeError as e:
+                    return {'error': str(e)}
+        
+        # One image per pooled interpreter at a time; more threads would only queue on the pools
+        workers = max(model.tuning['stage1']['pool_size'], model.tuning['stage2']['pool_size'])
+        with ThreadPoolExecutor(max_workers=min(workers, len(images))) as executor:
+            results = list(executor.map(analyze_one, range(len(images))))
+        
+        return jsonify({'results': results})
+        
+    except RequestEntityTooLarge as e:
+        metrics.reject()
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        print(f"❌ API Error: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        metrics.finish()
 
 @app.route('/test', methods=['GET'])
 def test_endpoint():
     """Test endpoint with sample data"""
     return jsonify({
         'message': 'TeaLeafNet TFLite API is running!',
-        'endpoints': ['/health', '/analyze', '/test'],
+        'endpoints': ['/health', '/analyze', '/analyze/binary', '/analyze/batch', '/models', '/metrics', '/test'],
         'status': 'ready'
     })
 
@@ -261,6 +926,10 @@ def get_ngrok_url():
 if __name__ == '__main__':
     print("\n🎉 TeaLeafNet TFLite API Server Starting...")
     
+    # Load the default model up front so startup errors surface immediately
+    print("🤖 Initializing TFLite models...")
+    registry.get(DEFAULT_MODEL_ID)
+    
     # Start ngrok in background
     print("🌍 Starting ngrok tunnel...")
     ngrok_thread = threading.Thread(target=start_ngrok, daemon=True)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Pre-fork multi-worker server for TeaLeafNet
+Imports TensorFlow and reads the model files once in the parent, then forks
+workers that build their own interpreters from the shared model bytes
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import sys
+import time
+import traceback
+
+from werkzeug.serving import make_server
+
+import google_colab_server as server
+
+# A worker that exits sooner than this after starting counts as a startup failure
+MIN_WORKER_UPTIME_SECONDS = 30
+MAX_RESTART_BACKOFF_SECONDS = 60
+
+def memory_breakdown():
+    """RSS, PSS and private (unshared) memory of this process in MB"""
+    values = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0].rstrip(':') in (
+                        'Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                    values[fields[0].rstrip(':')] = int(fields[1]) / 1024
+    except OSError:
+        # Without smaps only the total is known
+        return {'rss_mb': round(server.current_rss_bytes() / (1024 * 1024), 2)}
+
+    return {
+        'rss_mb': round(values.get('Rss', 0), 2),
+        'pss_mb': round(values.get('Pss', 0), 2),
+        'private_mb': round(values.get('Private_Clean', 0) + values.get('Private_Dirty', 0), 2)
+    }
+
+def model_paths(spec):
+    """Model files used by a registry spec"""
+    return [spec.get('leaf_model_path', server.DEFAULT_LEAF_MODEL_PATH),
+            spec.get('disease_model_path', server.DEFAULT_DISEASE_MODEL_PATH)]
+
+def load_model_buffers(model_ids):
+    """Download and read every model file once, before forking"""
+    for model_id in model_ids:
+        spec = server.registry.specs[model_id]
+        server.download_models(spec.get('model_urls', server.DEFAULT_MODEL_URLS))
+
+        for path in model_paths(spec):
+            if path not in server.registry.model_buffers:
+                # The TFLite Python API only takes bytes. Workers only read them,
+                # so the pages stay shared after fork.
+                with open(path, 'rb') as f:
+                    server.registry.model_buffers[path] = f.read()
+                print(f"📦 Loaded {path} ({os.path.getsize(path) / (1024 * 1024):.1f} MB) into shared memory")
+
+def run_worker(listener, model_ids, report_fd, host, port, worker_started, in_flight, slot):
+    """Worker process: build interpreters from the shared buffers and serve"""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    server.metrics = server.ServerMetrics(in_flight, slot)
+
+    for model_id in model_ids:
+        server.registry.get(model_id)
+
+    # Restarted workers have nobody waiting for a report
+    if report_fd is not None:
+        report = {
+            'pid': os.getpid(),
+            'startup_seconds': round(time.perf_counter() - worker_started, 3),
+            **memory_breakdown()
+        }
+        os.write(report_fd, (json.dumps(report) + '\n').encode())
+        os.close(report_fd)
+
+    httpd = make_server(host, port, server.app, threaded=True, fd=listener.fileno())
+    httpd.serve_forever()
+
+def spawn_worker(listener, model_ids, report_fd, host, port, in_flight, slot):
+    """Fork one worker publishing its in-flight count in in_flight[slot] and return its pid"""
+    # A worker that died mid-request left its count behind
+    in_flight[slot] = 0
+    worker_started = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(listener, model_ids, report_fd, host, port, worker_started, in_flight, slot)
+        except BaseException:
+            # os._exit skips the interpreter's own error printing
+            traceback.print_exc()
+            sys.stderr.flush()
+        finally:
+            os._exit(1)
+    return pid
+
+def read_reports(report_fd, count, timeout):
+    """Collect startup reports from up to count workers, giving up after timeout seconds"""
+    reports = []
+    pending = b''
+    deadline = time.monotonic() + timeout
+    while len(reports) < count:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([report_fd], [], [], remaining)[0]:
+            break
+        chunk = os.read(report_fd, 65536)
+        if not chunk:
+            # Every worker has either reported or exited
+            break
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        reports.extend(json.loads(line) for line in lines if line)
+    return reports
+
+def print_reports(reports):
+    """Print per-worker startup time and memory"""
+    print("\n📊 Worker startup:")
+    for report in reports:
+        print(f"  pid {report['pid']:>7}  startup {report['startup_seconds']:6.2f} s  "
+              f"RSS {report['rss_mb']:8.1f} MB  PSS {report.get('pss_mb', 0):8.1f} MB  "
+              f"private {report.get('private_mb', 0):8.1f} MB")
+
+    if reports and 'pss_mb' in reports[0]:
+        total_pss = sum(r['pss_mb'] for r in reports)
+        print(f"  Total PSS across workers: {total_pss:.1f} MB "
+              f"(RSS sum would suggest {sum(r['rss_mb'] for r in reports):.1f} MB)")
+
+def stop_workers(workers):
+    """Terminate every worker"""
+    for pid in list(workers):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+def main():
+    """Load models once, fork workers and keep them running"""
+    parser = argparse.ArgumentParser(description='Pre-fork TeaLeafNet API server')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=5000, help='Port to listen on')
+    parser.add_argument('--models', nargs='+', default=[server.DEFAULT_MODEL_ID],
+                        help='Model ids every worker loads at startup')
+    parser.add_argument('--startup-timeout', type=float, default=300,
+                        help='Seconds to wait for the initial workers to load their models')
+    parser.add_argument('--max-startup-failures', type=int, default=5,
+                        help='Give up after this many workers in a row fail soon after starting')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    print(f"\n🎉 TeaLeafNet pre-fork server starting with {args.workers} workers...")
+
+    load_model_buffers(args.models)
+
+    listener = socket.create_server((args.host, args.port), backlog=128)
+    listener.set_inheritable(True)
+
+    # Keep the parent's objects out of the garbage collector so workers don't copy their pages
+    gc.collect()
+    gc.freeze()
+
+    # Shared before forking so /metrics on any worker can report the whole server's load
+    in_flight = multiprocessing.Array('i', args.workers)
+
+    report_read, report_write = os.pipe()
+    workers = {}  # pid -> (start time, in_flight slot)
+    for slot in range(args.workers):
+        pid = spawn_worker(listener, args.models, report_write, args.host, args.port, in_flight, slot)
+        workers[pid] = (time.monotonic(), slot)
+
+    # Only workers hold the write end now, so a worker that dies during startup can't block us
+    os.close(report_write)
+    reports = read_reports(report_read, args.workers, args.startup_timeout)
+    os.close(report_read)
+
+    if not reports:
+        print("❌ No worker finished loading its models, stopping (see the errors above)")
+        stop_workers(workers)
+        raise SystemExit(1)
+    if len(reports) < args.workers:
+        print(f"⚠️  Only {len(reports)} of {args.workers} workers reported at startup")
+
+    print_reports(reports)
+    print(f"\n🚀 Serving on http://{args.host}:{args.port} "
+          f"(ready after {time.perf_counter() - started:.2f} s)")
+
+    def shutdown(signum, frame):
+        stop_workers(workers)
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    # Replace workers that die so capacity stays constant, backing off while they keep failing
+    startup_failures = 0
+    while True:
+        pid, status = os.wait()
+        if pid not in workers:
+            continue
+        started_at, slot = workers.pop(pid)
+
+        if time.monotonic() - started_at < MIN_WORKER_UPTIME_SECONDS:
+            startup_failures += 1
+        else:
+            startup_failures = 0
+
+        if startup_failures >= args.max_startup_failures:
+            print(f"❌ {startup_failures} workers in a row failed soon after starting, stopping")
+            stop_workers(workers)
+            raise SystemExit(1)
+
+        backoff = min(2 ** startup_failures - 1, MAX_RESTART_BACKOFF_SECONDS)
+        print(f"⚠️  Worker {pid} exited with status {status}, restarting in {backoff} s")
+        time.sleep(backoff)
+        pid = spawn_worker(listener, args.models, None, args.host, args.port, in_flight, slot)
+        workers[pid] = (time.monotonic(), slot)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Per-operator profiling for the TeaLeafNet TFLite stage models
+Runs timed invocations of each stage and exports the results as JSON
+"""
+
+import tensorflow as tf
+import numpy as np
+import argparse
+import json
+import os
+import subprocess
+import time
+
+# Stage models as served by google_colab_server.py
+DEFAULT_MODELS = {
+    'stage1_leaf_detection': 'models/leaf_detection.tflite',
+    'stage2_disease_classification': 'models/disease_classification.tflite'
+}
+
+# Ops whose cost we can estimate from tensor shapes (multiply-accumulates)
+MAC_OPS = ('CONV_2D', 'DEPTHWISE_CONV_2D', 'FULLY_CONNECTED', 'TRANSPOSE_CONV')
+
+def tensor_info(detail):
+    """Shape, dtype and size of a tensor"""
+    shape = [int(d) for d in detail['shape']]
+    dtype = np.dtype(detail['dtype'])
+    return {
+        'name': detail['name'],
+        'shape': shape,
+        'dtype': dtype.name,
+        'bytes': int(np.prod(shape)) * dtype.itemsize
+    }
+
+def current_rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Not Linux: fall back to the peak, which is the best we have
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def arena_tensor_indices(interpreter):
+    """Tensors allocated in the arena: inputs and op outputs (not constant weights)"""
+    arena = {detail['index'] for detail in interpreter.get_input_details()}
+    for op in interpreter._get_ops_details():
+        arena.update(int(index) for index in op['outputs'])
+    return arena
+
+def delegated_op_indices(ops):
+    """Ops replaced by a DELEGATE node (XNNPACK), found by walking back from its outputs"""
+    producers = {int(i): op for op in ops if op['op_name'] != 'DELEGATE' for i in op['outputs']}
+    delegated = set()
+    for delegate in (op for op in ops if op['op_name'] == 'DELEGATE'):
+        boundary = {int(i) for i in delegate['inputs']}
+        pending = [int(i) for i in delegate['outputs']]
+        while pending:
+            op = producers.get(pending.pop())
+            if op is None or op['index'] in delegated:
+                continue
+            delegated.add(op['index'])
+            pending.extend(int(i) for i in op['inputs'] if int(i) not in boundary and i >= 0)
+    return delegated
+
+def random_input(detail):
+    """Random input matching a tensor's shape and dtype"""
+    dtype = np.dtype(detail['dtype'])
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return np.random.randint(info.min, info.max + 1, size=detail['shape']).astype(dtype)
+    return np.random.rand(*detail['shape']).astype(dtype)
+
+def percentile(values, q):
+    """Percentile of a list of timings"""
+    return float(np.percentile(values, q)) if values else 0.0
+
+def estimate_macs(op, tensors):
+    """Estimate multiply-accumulates of an op from its tensor shapes"""
+    if op['op_name'] not in MAC_OPS or len(op['inputs']) < 2 or not len(op['outputs']):
+        return 0
+
+    weights = tensors.get(op['inputs'][1])
+    output = tensors.get(op['outputs'][0])
+    if weights is None or output is None:
+        return 0
+
+    weight_shape = list(weights['shape'])
+    output_elements = int(np.prod(output['shape']))
+
+    if op['op_name'] == 'FULLY_CONNECTED':
+        # weights are [units, input_features]
+        return output_elements * weight_shape[-1]
+    if op['op_name'] == 'DEPTHWISE_CONV_2D':
+        # weights are [1, kh, kw, channels]
+        return output_elements * weight_shape[1] * weight_shape[2]
+    # CONV_2D / TRANSPOSE_CONV weights are [out, kh, kw, in]
+    return output_elements * int(np.prod(weight_shape[1:]))
+
+def estimated_op_profile(interpreter, total_ms):
+    """Per-op breakdown apportioned from the measured invoke time by MAC share"""
+    tensors = {t['index']: t for t in interpreter.get_tensor_details()}
+    # DELEGATE nodes aren't graph ops; the ops they replaced are marked instead
+    all_ops = interpreter._get_ops_details()
+    delegated = delegated_op_indices(all_ops)
+    ops = [op for op in all_ops if op['op_name'] != 'DELEGATE']
+    macs = [estimate_macs(op, tensors) for op in ops]
+    total_macs = sum(macs)
+
+    profile = []
+    for op, op_macs in zip(ops, macs):
+        share = op_macs / total_macs if total_macs else 0.0
+        profile.append({
+            'index': int(op['index']),
+            'op': op['op_name'],
+            'subgraph': 0,
+            'delegated': op['index'] in delegated,
+            'macs': int(op_macs),
+            'estimated_ms': round(total_ms * share, 4),
+            'estimated_percent': round(share * 100, 2),
+            'output_bytes': sum(tensor_info(tensors[i])['bytes'] for i in op['outputs'] if i in tensors)
+        })
+
+    return profile
+
+def summarize_by_type(ops, time_key):
+    """Aggregate per-op timings by op type"""
+    summary = {}
+    for op in ops:
+        entry = summary.setdefault(op['op'], {'count': 0, 'ms': 0.0})
+        entry['count'] += 1
+        entry['ms'] = round(entry['ms'] + op.get(time_key, 0.0), 4)
+
+    return dict(sorted(summary.items(), key=lambda item: -item[1]['ms']))
+
+def parse_benchmark_output(output):
+    """Parse the per-op Run Order tables printed by TFLite's benchmark_model"""
+    ops = []
+    subgraph = 0
+    in_runs = False
+    in_run_order = False
+    delegate_internal = False
+
+    for line in output.splitlines():
+        stripped = line.strip()
+        # The initialization profile (ModifyGraphWithDelegate, AllocateTensors) comes first
+        if 'Regular Benchmark Runs' in stripped:
+            in_runs = True
+            continue
+        if not in_runs:
+            continue
+        if 'Subgraph (index:' in stripped:
+            subgraph = int(stripped.split('index:')[1].split(',')[0].strip())
+            delegate_internal = False
+            continue
+        if stripped.startswith('Delegate internal'):
+            delegate_internal = True
+            continue
+        if stripped.startswith('='):
+            in_run_order = 'Run Order' in stripped
+            continue
+        if not in_run_order or not stripped or stripped.startswith('['):
+            continue
+
+        # Tab-separated: [node type] [first] [avg ms] [%] [cdf%] [mem KB] [times called] [Name]
+        # (XNNPACK node types such as "Convolution (NHWC, F32) IGEMM" contain spaces)
+        fields = [field.strip() for field in line.split('\t') if field.strip()]
+        if len(fields) < 8:
+            continue
+        try:
+            ops.append({
+                'op': fields[0],
+                'subgraph': subgraph,
+                'delegate_internal': delegate_internal,
+                'first_ms': float(fields[1]),
+                'avg_ms': float(fields[2]),
+                'percent': float(fields[3].rstrip('%')),
+                'mem_kb': float(fields[5]),
+                'times_called': int(fields[6]),
+                'name': '\t'.join(fields[7:])
+            })
+        except ValueError:
+            continue
+
+    return ops
+
+def benchmark_binary_profile(binary, model_path, runs, warmup, num_threads):
+    """Exact per-op timings from TFLite's benchmark_model tool"""
+    command = [
+        binary,
+        f'--graph={model_path}',
+        f'--num_runs={runs}',
+        f'--warmup_runs={warmup}',
+        '--enable_op_profiling=true'
+    ]
+    if num_threads is not None:
+        command.append(f'--num_threads={num_threads}')
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    return parse_benchmark_output(result.stdout + result.stderr)
+
+def profile_model(name, model_path, runs, warmup, num_threads, benchmark_binary=None):
+    """Profile one stage model"""
+    print(f"\n🔬 Profiling {name} ({model_path})...")
+
+    # Current RSS, not ru_maxrss: the process peak is dominated by the TensorFlow import
+    rss_before = current_rss_bytes()
+
+    load_start = time.perf_counter()
+    interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+    interpreter.allocate_tensors()
+    load_ms = (time.perf_counter() - load_start) * 1000
+    rss_loaded = current_rss_bytes()
+
+    input_details = interpreter.get_input_details()
+    output_details = interpreter.get_output_details()
+    for detail in input_details:
+        interpreter.set_tensor(detail['index'], random_input(detail))
+
+    for _ in range(warmup):
+        interpreter.invoke()
+
+    timings = []
+    rss_peak = rss_loaded
+    for _ in range(runs):
+        start = time.perf_counter()
+        interpreter.invoke()
+        timings.append((time.perf_counter() - start) * 1000)
+        rss_peak = max(rss_peak, current_rss_bytes())
+
+    arena = arena_tensor_indices(interpreter)
+    tensor_details = interpreter.get_tensor_details()
+    mean_ms = float(np.mean(timings))
+
+    result = {
+        'model_path': model_path,
+        'model_bytes': os.path.getsize(model_path),
+        'num_threads': num_threads,
+        'load_ms': round(load_ms, 3),
+        'inputs': [tensor_info(d) for d in input_details],
+        'outputs': [tensor_info(d) for d in output_details],
+        'invoke_ms': {
+            'runs': runs,
+            'warmup': warmup,
+            'mean': round(mean_ms, 3),
+            'p50': round(percentile(timings, 50), 3),
+            'p95': round(percentile(timings, 95), 3),
+            'min': round(min(timings), 3),
+            'max': round(max(timings), 3)
+        },
+        'memory': {
+            'tensor_arena_bytes': sum(tensor_info(t)['bytes'] for t in tensor_details if t['index'] in arena),
+            'constant_tensor_bytes': sum(tensor_info(t)['bytes'] for t in tensor_details if t['index'] not in arena),
+            'rss_before_mb': round(rss_before / (1024 * 1024), 2),
+            'load_rss_increase_mb': round((rss_loaded - rss_before) / (1024 * 1024), 2),
+            'peak_rss_increase_mb': round((rss_peak - rss_before) / (1024 * 1024), 2)
+        }
+    }
+
+    if benchmark_binary:
+        ops = benchmark_binary_profile(benchmark_binary, model_path, runs, warmup, num_threads)
+        result['op_profile_source'] = 'benchmark_model'
+        result['ops'] = ops
+        result['ops_by_type'] = summarize_by_type([op for op in ops if not op['delegate_internal']], 'avg_ms')
+        result['delegate_ops_by_type'] = summarize_by_type([op for op in ops if op['delegate_internal']], 'avg_ms')
+        subgraphs = {}
+        # Ops inside a delegate are already timed as part of the delegate node
+        for op in (op for op in ops if not op['delegate_internal']):
+            subgraphs[op['subgraph']] = round(subgraphs.get(op['subgraph'], 0.0) + op['avg_ms'], 4)
+        result['subgraphs_ms'] = subgraphs
+    else:
+        ops = estimated_op_profile(interpreter, mean_ms)
+        result['op_profile_source'] = 'estimated_from_macs'
+        result['delegated_ops'] = sum(op['delegated'] for op in ops)
+        result['ops'] = ops
+        result['ops_by_type'] = summarize_by_type(ops, 'estimated_ms')
+        result['subgraphs_ms'] = {0: round(mean_ms, 4)}
+
+    print_summary(name, result)
+    return result
+
+def print_summary(name, result):
+    """Print a short profile summary"""
+    invoke = result['invoke_ms']
+    print(f"✅ {name}: mean {invoke['mean']:.2f} ms, p50 {invoke['p50']:.2f} ms, p95 {invoke['p95']:.2f} ms")
+
+    for tensor in result['inputs']:
+        print(f"   Input  {tensor['shape']} {tensor['dtype']} ({tensor['bytes'] / 1024:.1f} KB)")
+    for tensor in result['outputs']:
+        print(f"   Output {tensor['shape']} {tensor['dtype']} ({tensor['bytes'] / 1024:.1f} KB)")
+
+    memory = result['memory']
+    print(f"   Tensor arena: {memory['tensor_arena_bytes'] / (1024 * 1024):.2f} MB, "
+          f"weights: {memory['constant_tensor_bytes'] / (1024 * 1024):.2f} MB, "
+          f"RSS increase: {memory['load_rss_increase_mb']:.1f} MB on load, "
+          f"{memory['peak_rss_increase_mb']:.1f} MB peak")
+
+    print(f"   Top op types ({result['op_profile_source']}):")
+    if result.get('delegated_ops'):
+        print(f"     ({result['delegated_ops']} of {len(result['ops'])} ops run fused inside the XNNPACK "
+              f"delegate; their split is estimated, not measured)")
+    for op_type, entry in list(result['ops_by_type'].items())[:5]:
+        print(f"     {op_type:<24} x{entry['count']:<4} {entry['ms']:.3f} ms")
+
+def main():
+    """Profile both stage models"""
+    parser = argparse.ArgumentParser(description='Profile TeaLeafNet TFLite models')
+    parser.add_argument('--stage1', default=DEFAULT_MODELS['stage1_leaf_detection'], help='Stage 1 model path')
+    parser.add_argument('--stage2', default=DEFAULT_MODELS['stage2_disease_classification'], help='Stage 2 model path')
+    parser.add_argument('--runs', type=int, default=50, help='Timed invocations per model')
+    parser.add_argument('--warmup', type=int, default=5, help='Warm-up invocations per model')
+    parser.add_argument('--threads', type=int, default=None, help='Interpreter thread count')
+    parser.add_argument('--benchmark-binary', default=None,
+                        help="Path to TFLite's benchmark_model for exact per-op timings")
+    parser.add_argument('--output', default='model_profile.json', help='JSON report path')
+    args = parser.parse_args()
+
+    print("📊 Profiling TeaLeafNet TFLite models...")
+
+    models = {
+        'stage1_leaf_detection': args.stage1,
+        'stage2_disease_classification': args.stage2
+    }
+
+    report = {
+        'tensorflow_version': tf.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'models': {}
+    }
+
+    for name, model_path in models.items():
+        if not os.path.exists(model_path):
+            print(f"⚠️  Model not found: {model_path}")
+            continue
+        report['models'][name] = profile_model(
+            name, model_path, args.runs, args.warmup, args.threads, args.benchmark_binary
+        )
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n✅ Profile written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Stage 2 input-resolution sweep for TeaLeafNet
+Measures disease classification accuracy and latency at several input
+resolutions so each deployment can pick TEALEAF_STAGE2_RESOLUTION
+"""
+
+import tensorflow as tf
+import numpy as np
+import argparse
+import io
+import json
+import os
+import time
+
+# Decode and preprocess exactly as the server does
+from google_colab_server import UnsupportedInputSizeError, image_to_tensor, open_image, resize_input
+
+DEFAULT_MODEL_PATH = 'models/disease_classification.tflite'
+DEFAULT_CLASSES = ['bb', 'gl', 'rr', 'rsm']
+DEFAULT_RESOLUTIONS = [224, 256, 320, 384, 448, 512]
+LEAF_INPUT_SIZE = (160, 160)  # stage 1 input, which also bounds the server's decode size
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+def load_fixtures(fixtures_dir, classes):
+    """Load labelled encoded images from one sub-directory per class"""
+    fixtures = []
+    for label, class_name in enumerate(classes):
+        class_dir = os.path.join(fixtures_dir, class_name)
+        if not os.path.isdir(class_dir):
+            print(f"⚠️  No fixtures for class '{class_name}' in {class_dir}")
+            continue
+
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                # Keep the encoded bytes: the server's decode size depends on the resolution
+                with open(os.path.join(class_dir, filename), 'rb') as f:
+                    fixtures.append((f.read(), label))
+
+    print(f"📂 Loaded {len(fixtures)} labelled images from {fixtures_dir}")
+    return fixtures
+
+def create_interpreter(model_path, resolution):
+    """Create an interpreter with its input resized to resolution, or None if unsupported"""
+    interpreter = tf.lite.Interpreter(model_path=model_path)
+    try:
+        resize_input(interpreter, (resolution, resolution))
+    except UnsupportedInputSizeError as e:
+        print(f"⚠️  {e}")
+        return None
+
+    return interpreter
+
+def preprocess(encoded, resolution):
+    """Decode and preprocess an image the way TeaLeafModel does at this stage 2 resolution"""
+    draft_size = (max(LEAF_INPUT_SIZE[0], resolution), max(LEAF_INPUT_SIZE[1], resolution))
+    image = open_image(io.BytesIO(encoded), draft_size)
+    return image_to_tensor(image, (resolution, resolution))
+
+def evaluate_resolution(model_path, fixtures, resolution, warmup):
+    """Accuracy and latency of the model at one resolution"""
+    interpreter = create_interpreter(model_path, resolution)
+    if interpreter is None:
+        return None
+
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+
+    # Warm up on the first fixture so one-off allocations are not timed
+    for _ in range(warmup):
+        interpreter.set_tensor(input_index, preprocess(fixtures[0][0], resolution))
+        interpreter.invoke()
+
+    correct = 0
+    preprocess_times = []
+    invoke_times = []
+
+    for encoded, label in fixtures:
+        # Decoding is timed too, since the server's decode size depends on the resolution
+        start = time.perf_counter()
+        input_data = preprocess(encoded, resolution)
+        preprocess_times.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        interpreter.set_tensor(input_index, input_data)
+        interpreter.invoke()
+        output = interpreter.get_tensor(output_index)
+        invoke_times.append((time.perf_counter() - start) * 1000)
+
+        if int(np.argmax(output[0])) == label:
+            correct += 1
+
+    return {
+        'resolution': resolution,
+        'accuracy': correct / len(fixtures),
+        'preprocess_ms': float(np.mean(preprocess_times)),
+        'invoke_ms': float(np.mean(invoke_times)),
+        'latency_ms': float(np.mean(preprocess_times) + np.mean(invoke_times)),
+        'p95_latency_ms': float(np.percentile(np.add(preprocess_times, invoke_times), 95))
+    }
+
+def pareto_front(results):
+    """Resolutions not beaten on both accuracy and latency by another resolution"""
+    front = []
+    for result in results:
+        dominated = any(
+            other['accuracy'] >= result['accuracy'] and other['latency_ms'] <= result['latency_ms']
+            and (other['accuracy'] > result['accuracy'] or other['latency_ms'] < result['latency_ms'])
+            for other in results
+        )
+        if not dominated:
+            front.append(result['resolution'])
+    return sorted(front)
+
+def plot_results(results, front, chart_path):
+    """Chart accuracy against latency"""
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("⚠️  matplotlib not installed, skipping chart (pip install matplotlib)")
+        return
+
+    fig, ax = plt.subplots(figsize=(7, 5))
+    for result in results:
+        on_front = result['resolution'] in front
+        ax.scatter(result['latency_ms'], result['accuracy'] * 100,
+                   color='green' if on_front else 'gray', s=60)
+        ax.annotate(str(result['resolution']), (result['latency_ms'], result['accuracy'] * 100),
+                    textcoords='offset points', xytext=(5, 5))
+
+    front_points = sorted((r for r in results if r['resolution'] in front), key=lambda r: r['latency_ms'])
+    ax.plot([r['latency_ms'] for r in front_points], [r['accuracy'] * 100 for r in front_points],
+            color='green', linestyle='--', label='Pareto front')
+
+    ax.set_xlabel('Latency per image (ms)')
+    ax.set_ylabel('Accuracy (%)')
+    ax.set_title('Stage 2 accuracy vs latency by input resolution')
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(chart_path)
+    print(f"📈 Chart saved to {chart_path}")
+
+def main():
+    """Run the resolution sweep"""
+    parser = argparse.ArgumentParser(description='Sweep stage 2 input resolution')
+    parser.add_argument('fixtures', help='Directory with one sub-directory of images per class')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help='Stage 2 model path')
+    parser.add_argument('--classes', default=','.join(DEFAULT_CLASSES), help='Comma-separated class names')
+    parser.add_argument('--resolutions', default=','.join(map(str, DEFAULT_RESOLUTIONS)),
+                        help='Comma-separated square resolutions to try')
+    parser.add_argument('--warmup', type=int, default=3, help='Warm-up invocations per resolution')
+    parser.add_argument('--output', default='resolution_sweep.json', help='JSON report path')
+    parser.add_argument('--chart', default='resolution_sweep.png', help='Chart image path')
+    args = parser.parse_args()
+
+    classes = args.classes.split(',')
+    resolutions = [int(r) for r in args.resolutions.split(',')]
+
+    fixtures = load_fixtures(args.fixtures, classes)
+    if not fixtures:
+        print("❌ No fixtures found")
+        return
+
+    print(f"🔍 Sweeping {args.model} at {resolutions}...")
+    results = []
+    for resolution in resolutions:
+        result = evaluate_resolution(args.model, fixtures, resolution, args.warmup)
+        if result:
+            results.append(result)
+            print(f"  {resolution:>4}px  accuracy {result['accuracy'] * 100:5.1f}%  "
+                  f"latency {result['latency_ms']:7.2f} ms")
+
+    if not results:
+        print("❌ No resolution could be evaluated")
+        return
+
+    front = pareto_front(results)
+    print(f"\n✅ Pareto-optimal resolutions: {front}")
+    print("Set one with: TEALEAF_STAGE2_RESOLUTION=<resolution>")
+
+    with open(args.output, 'w') as f:
+        json.dump({'model': args.model, 'fixtures': len(fixtures),
+                   'results': results, 'pareto_front': front}, f, indent=2)
+    print(f"📋 Results written to {args.output}")
+
+    plot_results(results, front, args.chart)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Stand-in TFLite models and fixture images shared by the test suites
+Tiny models with fixed weights, so tests and benchmarks run without the
+real TeaLeafNet models
+"""
+
+import base64
+import io
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+# Fixture image sizes, from a phone thumbnail up to a 12 MP photo
+IMAGE_SIZES = {
+    'small': (320, 240),
+    'medium': (1600, 1200),
+    'large': (4000, 3000)
+}
+
+def build_standin_model(input_size, outputs, path, seed):
+    """Tiny conv classifier with deterministic weights, converted to TFLite"""
+    inputs = tf.keras.Input((input_size, input_size, 3))
+    x = tf.keras.layers.Conv2D(8, 3, strides=4, activation='relu')(inputs)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    x = tf.keras.layers.Dense(outputs, activation='sigmoid' if outputs == 1 else 'softmax')(x)
+    model = tf.keras.Model(inputs, x)
+
+    rng = np.random.RandomState(seed)
+    model.set_weights([rng.uniform(-1, 1, w.shape).astype(np.float32) for w in model.get_weights()])
+
+    with open(path, 'wb') as f:
+        f.write(tf.lite.TFLiteConverter.from_keras_model(model).convert())
+    return path
+
+def fixture_image(width, height, seed):
+    """Deterministic leaf-coloured test image as base64 JPEG"""
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([
+        40 + 60 * x / width,
+        120 + 80 * y / height,
+        30 + 40 * (x + y) / (width + height)
+    ], axis=-1)
+    pixels += rng.normal(0, 12, pixels.shape)
+
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format='JPEG', quality=90)
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
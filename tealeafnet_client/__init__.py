@@ -0,0 +1,7 @@
+"""
+Python client for the TeaLeafNet analysis API
+"""
+
+from .client import TeaLeafClient, LatencyStats
+
+__all__ = ['TeaLeafClient', 'LatencyStats']
@@ -0,0 +1,173 @@
+"""
+TeaLeafNet API client with pooled keep-alive connections, retries with
+backoff and bounded concurrent submission
+"""
+
+import base64
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+class LatencyStats:
+    """Thread-safe record of client-side request latencies"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies_ms = []
+        self.errors = 0
+
+    def record(self, latency_ms, ok=True):
+        with self.lock:
+            self.latencies_ms.append(latency_ms)
+            if not ok:
+                self.errors += 1
+
+    def summary(self):
+        """Count, error count and latency percentiles in ms"""
+        with self.lock:
+            latencies = list(self.latencies_ms)
+            errors = self.errors
+
+        if not latencies:
+            return {'count': 0, 'errors': errors}
+
+        return {
+            'count': len(latencies),
+            'errors': errors,
+            'mean_ms': round(float(np.mean(latencies)), 3),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+            'max_ms': round(max(latencies), 3)
+        }
+
+class TeaLeafClient:
+    """Client for the TeaLeafNet API
+
+    Images can be given as file paths or raw encoded bytes (JPEG, PNG, ...).
+    The upload format is picked from the endpoints the server advertises on
+    /test: raw bytes on /analyze/binary and grouped uploads on /analyze/batch
+    when available, base64 JSON on /analyze otherwise.
+    """
+
+    def __init__(self, base_url, max_connections=8, max_workers=8, retries=3, backoff=0.5,
+                 timeout=60, batch_size=8):
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.stats = LatencyStats()  # single-image analysis requests
+        self.batch_stats = LatencyStats()  # /analyze/batch requests, one sample per batch
+        self._endpoints = None
+
+        # Analysis has no side effects, so POSTs are safe to retry too
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def request(self, method, path, stats=None, **kwargs):
+        """Send a request on the pooled session, recording its latency in stats if given"""
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', timeout=self.timeout, **kwargs)
+            ok = response.ok
+            response.raise_for_status()
+            return response.json()
+        finally:
+            if stats is not None:
+                stats.record((time.perf_counter() - start) * 1000, ok)
+
+    def health(self):
+        return self.request('GET', '/health')
+
+    def endpoints(self):
+        """Endpoints the server advertises, fetched once"""
+        if self._endpoints is None:
+            self._endpoints = set(self.request('GET', '/test').get('endpoints', []))
+        return self._endpoints
+
+    def supports(self, endpoint):
+        return endpoint in self.endpoints()
+
+    @staticmethod
+    def read_image(image):
+        """Encoded image bytes from a path or bytes"""
+        if isinstance(image, (bytes, bytearray)):
+            return bytes(image)
+        if isinstance(image, (str, os.PathLike)):
+            with open(image, 'rb') as f:
+                return f.read()
+        raise TypeError(f"Unsupported image type: {type(image).__name__}")
+
+    def analyze(self, image, model=None):
+        """Analyze one image"""
+        data = self.read_image(image)
+
+        if self.supports('/analyze/binary'):
+            params = {'model': model} if model else None
+            return self.request('POST', '/analyze/binary', stats=self.stats, data=data, params=params,
+                                headers={'Content-Type': 'application/octet-stream'})
+
+        payload = {'image': base64.b64encode(data).decode('utf-8')}
+        if model:
+            payload['model'] = model
+        return self.request('POST', '/analyze', stats=self.stats, json=payload)
+
+    def analyze_batch(self, images, model=None):
+        """Analyze a group of images in one /analyze/batch request"""
+        payload = {'images': [base64.b64encode(self.read_image(image)).decode('utf-8') for image in images]}
+        if model:
+            payload['model'] = model
+        return self.request('POST', '/analyze/batch', stats=self.batch_stats, json=payload)['results']
+
+    def analyze_many(self, images, model=None):
+        """Analyze many images concurrently, returning results in input order
+
+        Failed images get {'error': message} instead of a result.
+        """
+        images = list(images)
+
+        def safe(fn, *args):
+            try:
+                return fn(*args)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            if self.supports('/analyze/batch') and self.batch_size > 1:
+                chunks = [images[i:i + self.batch_size] for i in range(0, len(images), self.batch_size)]
+                results = []
+                for chunk, outcome in zip(chunks, executor.map(lambda c: safe(self.analyze_batch, c, model), chunks)):
+                    if isinstance(outcome, Exception):
+                        results.extend({'error': str(outcome)} for _ in chunk)
+                    else:
+                        results.extend(outcome)
+                return results
+
+            outcomes = executor.map(lambda image: safe(self.analyze, image, model), images)
+            return [{'error': str(o)} if isinstance(o, Exception) else o for o in outcomes]
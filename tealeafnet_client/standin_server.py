@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Stand-in TeaLeafNet API for testing clients and coordinators without models
+Implements the same endpoints as google_colab_server.py with deterministic
+fake results, over HTTP/1.1 keep-alive connections.
+Run with: python -m tealeafnet_client.standin_server --port 5001
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+DISEASE_CLASSES = ['bb', 'gl', 'rr', 'rsm']
+
+def fake_result(image_bytes):
+    """Deterministic result derived from the image bytes"""
+    digest = hashlib.sha256(image_bytes).digest()
+    is_leaf = digest[0] % 4 != 0
+    return {
+        'isLeaf': is_leaf,
+        'leafConfidence': 0.5 + digest[1] / 510,
+        'diseaseClass': DISEASE_CLASSES[digest[2] % len(DISEASE_CLASSES)] if is_leaf else None,
+        'diseaseConfidence': 0.25 + digest[3] / 340 if is_leaf else None
+    }
+
+class StandinServer(ThreadingHTTPServer):
+    """Threaded stand-in server; fail_rate makes a share of analyses return 503"""
+
+    daemon_threads = True
+
+    def __init__(self, address, delay_ms=0.0, fail_rate=0.0, binary=True, batch=True, seed=0):
+        super().__init__(address, StandinRequestHandler)
+        self.delay_ms = delay_ms
+        self.fail_rate = fail_rate
+        self.binary = binary
+        self.batch = batch
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.state = {'requests': 0, 'in_flight': 0, 'failures': 0, 'connections': 0}
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def endpoints(self):
+        endpoints = ['/health', '/analyze', '/metrics', '/test']
+        if self.binary:
+            endpoints.append('/analyze/binary')
+        if self.batch:
+            endpoints.append('/analyze/batch')
+        return endpoints
+
+    def analyze(self, image_bytes):
+        """Fake analysis of one image, or None for an injected failure"""
+        with self.lock:
+            self.state['requests'] += 1
+            self.state['in_flight'] += 1
+            fail = self.rng.random() < self.fail_rate
+        try:
+            time.sleep(self.delay_ms / 1000)
+            if fail:
+                with self.lock:
+                    self.state['failures'] += 1
+                return None
+            return fake_result(image_bytes)
+        finally:
+            with self.lock:
+                self.state['in_flight'] -= 1
+
+class StandinRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.state['connections'] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def send_result(self, result):
+        if result is None:
+            self.send_json({'error': 'Injected failure'}, 503)
+        else:
+            self.send_json(result)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/health':
+            self.send_json({'status': 'healthy', 'service': 'TeaLeafNet stand-in API', 'models_loaded': True})
+        elif path == '/metrics':
+            with self.server.lock:
+                self.send_json(dict(self.server.state))
+        elif path == '/test':
+            self.send_json({'message': 'TeaLeafNet stand-in API is running!',
+                            'endpoints': self.server.endpoints(), 'status': 'ready'})
+        else:
+            self.send_json({'error': 'Not found'}, 404)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        body = self.read_body()
+
+        if path == '/analyze':
+            data = json.loads(body or b'{}')
+            if 'image' not in data:
+                return self.send_json({'error': 'No image provided'}, 400)
+            self.send_result(self.server.analyze(base64.b64decode(data['image'])))
+
+        elif path == '/analyze/binary' and self.server.binary:
+            if not body:
+                return self.send_json({'error': 'No image provided'}, 400)
+            self.send_result(self.server.analyze(body))
+
+        elif path == '/analyze/batch' and self.server.batch:
+            data = json.loads(body or b'{}')
+            if not data.get('images'):
+                return self.send_json({'error': 'No images provided'}, 400)
+            results = [self.server.analyze(base64.b64decode(image)) for image in data['images']]
+            if any(result is None for result in results):
+                return self.send_json({'error': 'Injected failure'}, 503)
+            self.send_json({'results': results})
+
+        else:
+            self.send_json({'error': 'Not found'}, 404)
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in TeaLeafNet API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--delay-ms', type=float, default=0.0, help='Simulated inference time per image')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of analyses that return 503')
+    parser.add_argument('--no-binary', action='store_true', help="Don't offer /analyze/binary")
+    parser.add_argument('--no-batch', action='store_true', help="Don't offer /analyze/batch")
+    args = parser.parse_args()
+
+    httpd = StandinServer((args.host, args.port), args.delay_ms, args.fail_rate,
+                          binary=not args.no_binary, batch=not args.no_batch)
+    print(f"🧪 Stand-in TeaLeafNet API on {httpd.url}")
+    httpd.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for the tealeafnet_client SDK against the local stand-in server
+Run with: python -m pytest test_client_sdk.py -q
+"""
+
+import io
+import threading
+
+import pytest
+from PIL import Image
+
+from tealeafnet_client import TeaLeafClient
+from tealeafnet_client.standin_server import StandinServer, fake_result
+
+def jpeg_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color=color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+IMAGES = [jpeg_bytes((i * 20, 120, 40)) for i in range(10)]
+
+@pytest.fixture
+def standin(request):
+    """Start a stand-in server in a thread, configured by the test's parametrization"""
+    httpd = StandinServer(('127.0.0.1', 0), **getattr(request, 'param', {}))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.url
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_analyze_uses_binary_upload(standin):
+    with TeaLeafClient(standin) as client:
+        assert client.analyze(IMAGES[0]) == fake_result(IMAGES[0])
+        assert client.supports('/analyze/binary')
+
+@pytest.mark.parametrize('standin', [{'binary': False, 'batch': False}], indirect=True)
+def test_falls_back_to_base64_json(standin):
+    with TeaLeafClient(standin) as client:
+        assert client.analyze(IMAGES[1]) == fake_result(IMAGES[1])
+        assert client.analyze_many(IMAGES) == [fake_result(image) for image in IMAGES]
+
+def test_analyze_many_batches_and_keeps_order(standin):
+    with TeaLeafClient(standin, batch_size=3, max_workers=4) as client:
+        assert client.analyze_many(IMAGES) == [fake_result(image) for image in IMAGES]
+        # ceil(10 / 3) batch requests; the /test lookup isn't an analysis
+        assert client.batch_stats.summary()['count'] == 4
+        assert client.stats.summary()['count'] == 0
+
+def test_sequential_requests_reuse_one_connection(standin):
+    with TeaLeafClient(standin) as client:
+        for image in IMAGES:
+            client.analyze(image)
+        assert client.request('GET', '/metrics')['connections'] == 1
+
+@pytest.mark.parametrize('standin', [{'fail_rate': 0.3, 'batch': False}], indirect=True)
+def test_retries_transient_failures(standin):
+    with TeaLeafClient(standin, retries=10, backoff=0.01) as client:
+        assert client.analyze_many(IMAGES) == [fake_result(image) for image in IMAGES]
+        assert client.request('GET', '/metrics')['failures'] > 0
+
+@pytest.mark.parametrize('standin', [{'fail_rate': 1.0, 'batch': False}], indirect=True)
+def test_reports_errors_per_image(standin):
+    with TeaLeafClient(standin, retries=1, backoff=0.01) as client:
+        results = client.analyze_many(IMAGES[:3])
+        assert all('error' in result for result in results)
+        assert client.stats.summary()['errors'] == 3
+
+@pytest.mark.parametrize('standin', [{'batch': False}], indirect=True)
+def test_latency_stats(standin):
+    with TeaLeafClient(standin) as client:
+        client.health()
+        client.analyze_many(IMAGES)
+        summary = client.stats.summary()
+        # One sample per image, nothing for /health or the /test lookup
+        assert summary['count'] == len(IMAGES)
+        assert summary['errors'] == 0
+        assert 0 < summary['p50_ms'] <= summary['p95_ms'] <= summary['max_ms']
+        assert client.batch_stats.summary()['count'] == 0
@@ -4,17 +4,21 @@ Test script for Google Colab TFLite API
 Run this to test your API endpoints
 """
 
-import requests
 import base64
 import json
 
+from tealeafnet_client import TeaLeafClient
+
 # Replace with your actual ngrok URL
 API_URL = "https://your-ngrok-url.ngrok.io"
 
+# One pooled session for all tests instead of a new connection per request
+client = TeaLeafClient(API_URL, retries=0)
+
 def test_health():
     """Test health endpoint"""
     try:
-        response = requests.get(f"{API_URL}/health")
+        response = client.session.get(f"{API_URL}/health")
         print(f"Health Check: {response.status_code}")
         print(f"Response: {response.json()}")
         return response.status_code == 200
@@ -39,7 +43,7 @@ def test_analyze():
         img_base64 = base64.b64encode(img_byte_arr).decode('utf-8')
         
         # Send to API
-        response = requests.post(f"{API_URL}/analyze", json={
+        response = client.session.post(f"{API_URL}/analyze", json={
             "image": img_base64,
             "timestamp": "2024-01-01T00:00:00Z"
         })
@@ -55,7 +59,7 @@ def test_analyze():
 def test_test_endpoint():
     """Test test endpoint"""
     try:
-        response = requests.get(f"{API_URL}/test")
+        response = client.session.get(f"{API_URL}/test")
         print(f"Test Endpoint: {response.status_code}")
         print(f"Response: {response.json()}")
         return response.status_code == 200
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the coordinator against several local stand-in servers
+Run with: python -m pytest test_coordinator.py -q
+"""
+
+import base64
+import io
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from coordinator import Coordinator, create_app
+from tealeafnet_client.standin_server import StandinServer, fake_result
+
+def jpeg_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color=color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+IMAGES = [jpeg_bytes((i * 20, 120, 40)) for i in range(12)]
+ENCODED = [base64.b64encode(image).decode() for image in IMAGES]
+
+@pytest.fixture
+def nodes(request):
+    """Start one stand-in server per config in the test's parametrization"""
+    configs = getattr(request, 'param', [{}, {}, {}])
+    servers = []
+    for config in configs:
+        httpd = StandinServer(('127.0.0.1', 0), **config)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+    yield servers
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+@pytest.fixture
+def coordinator(nodes):
+    coordinator = Coordinator([httpd.url for httpd in nodes], failure_threshold=1)
+    coordinator.check_all()
+    yield coordinator
+    coordinator.stop()
+
+@pytest.fixture
+def app_client(coordinator):
+    return create_app(coordinator).test_client()
+
+def test_routes_to_least_loaded_node(coordinator):
+    busy, idle, down = coordinator.nodes
+    busy.queue_depth = 5
+    down.healthy = False
+
+    node = coordinator.acquire()
+    assert node is idle
+    # The coordinator's own in-flight requests count as load too
+    idle.in_flight += 5
+    assert coordinator.acquire() is busy
+
+@pytest.mark.parametrize('nodes', [[{'delay_ms': 500}]], indirect=True)
+def test_own_requests_are_not_counted_twice(coordinator):
+    node, = coordinator.nodes
+    pending = [threading.Thread(target=coordinator.forward, args=('POST', '/analyze/binary'),
+                                 kwargs={'data': image}) for image in IMAGES[:2]]
+    for thread in pending:
+        thread.start()
+    time.sleep(0.2)
+
+    # The node reports our two requests; they must only count once
+    coordinator.check_node(node)
+    assert node.queue_depth == 0
+    assert node.load() == 2
+    for thread in pending:
+        thread.join()
+
+def test_analyze_forwards_request(app_client):
+    response = app_client.post('/analyze', json={'image': ENCODED[0]})
+    assert response.status_code == 200
+    assert response.get_json() == fake_result(IMAGES[0])
+
+    response = app_client.post('/analyze/binary', data=IMAGES[1])
+    assert response.get_json() == fake_result(IMAGES[1])
+
+@pytest.mark.parametrize('nodes', [[{'fail_rate': 1.0}, {}]], indirect=True)
+def test_retries_failed_request_on_another_node(app_client, coordinator, nodes):
+    for image in IMAGES[:4]:
+        response = app_client.post('/analyze/binary', data=image)
+        assert response.get_json() == fake_result(image)
+
+    failing, _ = coordinator.nodes
+    assert not failing.healthy
+    assert nodes[1].state['requests'] == 4
+
+def test_skips_unreachable_node(nodes):
+    coordinator = Coordinator(['http://127.0.0.1:1'] + [httpd.url for httpd in nodes])
+    coordinator.check_all()
+    assert coordinator.stats()['healthy_nodes'] == len(nodes)
+
+    response = create_app(coordinator).test_client().post('/analyze/binary', data=IMAGES[0])
+    assert response.get_json() == fake_result(IMAGES[0])
+
+def test_batch_is_split_across_nodes(app_client, nodes):
+    response = app_client.post('/analyze/batch', json={'images': ENCODED})
+    assert response.get_json()['results'] == [fake_result(image) for image in IMAGES]
+    assert all(httpd.state['requests'] == 4 for httpd in nodes)
+
+@pytest.mark.parametrize('nodes', [[{}, {'fail_rate': 1.0}, {}]], indirect=True)
+def test_failed_shard_is_retried_elsewhere(app_client, nodes):
+    response = app_client.post('/analyze/batch', json={'images': ENCODED})
+    assert response.status_code == 200
+    assert response.get_json()['results'] == [fake_result(image) for image in IMAGES]
+    assert nodes[1].state['failures'] > 0
+
+@pytest.mark.parametrize('nodes', [[{'batch': False}, {'batch': False}]], indirect=True)
+def test_batch_client_errors_are_passed_through(app_client, nodes):
+    response = app_client.post('/analyze/batch', json={'images': ENCODED})
+    assert response.status_code == 404
+    # A client error isn't retried on other nodes
+    assert all(httpd.state['requests'] == 0 for httpd in nodes)
+
+@pytest.mark.parametrize('nodes', [[{'fail_rate': 1.0}]], indirect=True)
+def test_reports_503_when_every_node_fails(app_client):
+    response = app_client.post('/analyze/binary', data=IMAGES[0])
+    assert response.status_code == 503
+    assert app_client.get('/health').status_code == 503
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for parsing TFLite benchmark_model op profiles in profile_models.py
+Run with: python -m pytest test_profile_models.py -q
+"""
+
+from profile_models import parse_benchmark_output
+
+HEADER = '\t             [node type]\t  [first]\t [avg ms]\t     [%]\t  [cdf%]\t  [mem KB]\t[times called]\t[Name]'
+SUMMARY_HEADER = '\t             [Node type]\t  [count]\t  [avg ms]\t    [avg %]\t    [cdf %]\t  [mem KB]\t[times called]'
+
+# Layout of `benchmark_model --enable_op_profiling=true` output for a model run through XNNPACK
+BENCHMARK_OUTPUT = '\n'.join([
+    'INFO: Profiling Info for Benchmark Initialization:',
+    '============================== Run Order ==============================',
+    HEADER,
+    '\t ModifyGraphWithDelegate\t    4.121\t    4.121\t 97.815%\t 97.815%\t   596.000\t        1\tModifyGraphWithDelegate/0',
+    '\t         AllocateTensors\t    0.092\t    0.046\t  2.185%\t100.000%\t     0.000\t        2\tAllocateTensors/0',
+    '',
+    '============================== Summary by node type ==============================',
+    SUMMARY_HEADER,
+    '\t ModifyGraphWithDelegate\t        1\t     4.121\t    97.815%\t    97.815%\t   596.000\t        1',
+    '',
+    'Timings (microseconds): count=1 curr=4213',
+    '',
+    'INFO: Operator-wise Profiling Info for Regular Benchmark Runs:',
+    '============================== Run Order ==============================',
+    HEADER,
+    '\t   TfLiteXNNPackDelegate\t    1.402\t    1.388\t 99.212%\t 99.212%\t     0.000\t        1\t[StatefulPartitionedCall_1:0]:4',
+    '\t                 SOFTMAX\t    0.012\t    0.011\t  0.788%\t100.000%\t     0.000\t        1\t[StatefulPartitionedCall_1:0]:5',
+    '',
+    '============================== Top by Computation Time ==============================',
+    HEADER,
+    '\t   TfLiteXNNPackDelegate\t    1.402\t    1.388\t 99.212%\t 99.212%\t     0.000\t        1\t[StatefulPartitionedCall_1:0]:4',
+    '',
+    '============================== Summary by node type ==============================',
+    SUMMARY_HEADER,
+    '\t   TfLiteXNNPackDelegate\t        1\t     1.388\t    99.212%\t    99.212%\t     0.000\t        1',
+    '',
+    'Timings (microseconds): count=50 first=1414 curr=1399 min=1380 max=1460 avg=1399 std=17',
+    '',
+    'Delegate internal: ',
+    '============================== Run Order ==============================',
+    HEADER,
+    '\tConvolution (NHWC, F32) IGEMM\t    1.201\t    1.190\t 86.000%\t 86.000%\t     0.000\t        1\t'
+    'Delegate/Convolution (NHWC, F32) IGEMM:0',
+    '\tGlobal Average Pooling (NWC, F32)\t    0.150\t    0.149\t 10.800%\t 96.800%\t     0.000\t        1\t'
+    'Delegate/Global Average Pooling (NWC, F32):1',
+    '\tFully Connected (NC, F32) GEMM\t    0.044\t    0.044\t  3.200%\t100.000%\t     0.000\t        1\t'
+    'Delegate/Fully Connected (NC, F32) GEMM:2',
+    '',
+    '============================== Top by Computation Time ==============================',
+    HEADER,
+    '\tConvolution (NHWC, F32) IGEMM\t    1.201\t    1.190\t 86.000%\t 86.000%\t     0.000\t        1\t'
+    'Delegate/Convolution (NHWC, F32) IGEMM:0',
+])
+
+def test_skips_initialization_and_summary_tables():
+    ops = parse_benchmark_output(BENCHMARK_OUTPUT)
+    names = [op['op'] for op in ops]
+    assert 'ModifyGraphWithDelegate' not in names
+    assert 'AllocateTensors' not in names
+    # Only the Run Order tables, not Top by Computation Time
+    assert len(ops) == 5
+
+def test_reads_tab_separated_rows_with_spaces_in_node_types():
+    ops = parse_benchmark_output(BENCHMARK_OUTPUT)
+    delegated = [op for op in ops if op['delegate_internal']]
+    assert [op['op'] for op in delegated] == [
+        'Convolution (NHWC, F32) IGEMM', 'Global Average Pooling (NWC, F32)', 'Fully Connected (NC, F32) GEMM'
+    ]
+    assert delegated[0]['avg_ms'] == 1.19
+    assert delegated[0]['name'] == 'Delegate/Convolution (NHWC, F32) IGEMM:0'
+
+    graph_ops = [op for op in ops if not op['delegate_internal']]
+    assert [(op['op'], op['avg_ms'], op['times_called']) for op in graph_ops] == [
+        ('TfLiteXNNPackDelegate', 1.388, 1), ('SOFTMAX', 0.011, 1)
+    ]
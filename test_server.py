@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Tests for google_colab_server.py against tiny stand-in TFLite models
+Run with: python -m pytest test_server.py -q
+"""
+
+import base64
+import io
+import multiprocessing
+import os
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import google_colab_server as server
+from standin_fixtures import build_standin_model
+
+@pytest.fixture(scope='module')
+def model_spec(tmp_path_factory):
+    """Registry spec for TeaLeafModel backed by the stand-in models"""
+    model_dir = tmp_path_factory.mktemp('models')
+    # Two interpreters per stage so batch images really run concurrently
+    settings = dict(server.DEFAULT_STAGE_SETTINGS, num_threads=1, pool_size=2)
+    return {
+        'leaf_model_path': build_standin_model(160, 1, str(model_dir / 'leaf.tflite'), seed=3),
+        'disease_model_path': build_standin_model(512, 4, str(model_dir / 'disease.tflite'), seed=2),
+        'disease_input_size': [512, 512],
+        'model_urls': {},
+        'tuning': {'stage1': settings, 'stage2': settings}
+    }
+
+@pytest.fixture
+def client(model_spec, monkeypatch):
+    """Flask test client serving the stand-in models as the default model"""
+    monkeypatch.setattr(server, 'registry', server.ModelRegistry({server.DEFAULT_MODEL_ID: model_spec}))
+    monkeypatch.setattr(server, 'metrics', server.ServerMetrics())
+    return server.app.test_client()
+
+def png_bytes(width, height):
+    """Noisy PNG, which can't be decoded at reduced scale like a JPEG"""
+    pixels = np.random.RandomState(0).randint(0, 256, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize('width, height', [(1200, 1000), (1500, 1400)], ids=['over_limit', 'over_twice_limit'])
+def test_oversized_images_are_refused(client, monkeypatch, width, height):
+    # Pillow raises its own error above twice the limit; both sides must give 413
+    monkeypatch.setattr(server, 'MAX_IMAGE_PIXELS', 1_000_000)
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1_000_000)
+    image = png_bytes(width, height)
+    encoded = base64.b64encode(image).decode()
+
+    assert client.post('/analyze', json={'image': encoded}).status_code == 413
+    assert client.post('/analyze/binary', data=image).status_code == 413
+
+    response = client.post('/analyze/batch', json={'images': [encoded]})
+    assert response.status_code == 200
+    assert 'error' in response.get_json()['results'][0]
+    assert client.get('/metrics').get_json()['rejected'] == 2
+
+def test_binary_upload_matches_base64(client):
+    image = png_bytes(64, 64)
+    expected = client.post('/analyze', json={'image': base64.b64encode(image).decode()}).get_json()
+
+    response = client.post('/analyze/binary', data=image)
+    assert response.status_code == 200
+    assert response.get_json() == expected
+
+@pytest.mark.parametrize('separator', ['\n', '\r\n', '\t', ' '], ids=['lf', 'crlf', 'tab', 'space'])
+def test_wrapped_base64_decodes_across_chunks(client, separator):
+    image = png_bytes(200, 200)
+    encoded = base64.b64encode(image).decode()
+    assert len(encoded) > server.DECODE_CHUNK_CHARS
+    # Wrapped at 76 characters like MIME, so chunk boundaries fall mid-line
+    wrapped = separator.join(encoded[i:i + 76] for i in range(0, len(encoded), 76))
+
+    response = client.post('/analyze', json={'image': wrapped})
+    assert response.status_code == 200
+    assert response.get_json() == client.post('/analyze/binary', data=image).get_json()
+
+def test_empty_uploads_are_rejected(client):
+    assert client.post('/analyze/binary', data=b'').status_code == 400
+    assert client.post('/analyze/batch', json={'images': []}).status_code == 400
+
+def test_batch_over_limit_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(server, 'MAX_BATCH_IMAGES', 2)
+    encoded = base64.b64encode(png_bytes(64, 64)).decode()
+    assert client.post('/analyze/batch', json={'images': [encoded] * 3}).status_code == 413
+
+def test_batch_keeps_order_and_reports_errors_per_image(client, monkeypatch):
+    monkeypatch.setattr(server, 'MAX_IMAGE_PIXELS', 100_000)
+    images = [base64.b64encode(png_bytes(size, size)).decode() for size in (64, 400, 96, 128)]
+    expected = [client.post('/analyze', json={'image': image}).get_json() for image in images]
+
+    response = client.post('/analyze/batch', json={'images': images})
+    results = response.get_json()['results']
+    assert response.status_code == 200
+    assert 'error' in results[1]
+    assert [results[i] for i in (0, 2, 3)] == [expected[i] for i in (0, 2, 3)]
+    assert len({result['leafConfidence'] for result in results if 'error' not in result}) == 3
+
+def test_average_request_memory_ignores_requests_without_stats(client):
+    encoded = base64.b64encode(png_bytes(64, 64)).decode()
+    held_mb = float(client.post('/analyze', json={'image': encoded}).headers['X-Peak-Memory-MB'])
+    client.post('/analyze', json={})
+
+    assert client.get('/metrics').get_json()['avg_request_held_mb'] == pytest.approx(held_mb, abs=1e-3)
+
+def test_metrics_report_in_flight_across_workers():
+    # Two pre-forked workers share the counter; the other one is busy with three requests
+    in_flight = multiprocessing.Array('i', 2)
+    in_flight[0] = 3
+    metrics = server.ServerMetrics(in_flight, worker_slot=1)
+
+    metrics.start()
+    snapshot = metrics.snapshot()
+    assert (snapshot['in_flight'], snapshot['worker_in_flight']) == (4, 1)
+    metrics.finish()
+    assert list(in_flight) == [3, 0]
+
+def noisy_image(color, size=200, noise=12):
+    """Textured image of one colour, small enough to be checked without downscaling"""
+    # Brightness noise only, so the hue stays the same everywhere
+    pixels = np.array(color, dtype=np.float32) + np.random.RandomState(1).normal(0, noise, (size, size, 1))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+@pytest.mark.parametrize('image, reason', [
+    (Image.new('RGB', (200, 200), (60, 160, 50)), 'blurry'),
+    (noisy_image((10, 30, 10)), 'underexposed'),
+    (noisy_image((225, 250, 225)), 'overexposed'),
+    (Image.fromarray(np.repeat(np.repeat([[0, 255]], 200, axis=0), 100, axis=1).astype(np.uint8)).convert('RGB'),
+     'clipped'),
+    (noisy_image((120, 120, 120)), 'not_plant')
+])
+def test_quality_filter_failure_reasons(image, reason):
+    quality_filter = server.QualityFilter('flag')
+    quality = quality_filter.check(image)
+    assert not quality['passed']
+    assert reason in quality['reasons']
+    assert quality_filter.stats()['failures_by_reason'][reason] == 1
+
+def test_quality_filter_passes_leaf_and_keeps_rusty_leaves():
+    quality_filter = server.QualityFilter('reject')
+    assert quality_filter.check(noisy_image((60, 160, 50)))['passed']
+
+    # A rust-coloured leaf fails the green check, which alone must not reject it
+    rusty = quality_filter.check(noisy_image((170, 90, 40)))
+    assert rusty['reasons'] == ['not_plant']
+    assert not quality_filter.should_reject(rusty)
+
+    blurry = quality_filter.check(Image.new('RGB', (200, 200), (170, 90, 40)))
+    assert quality_filter.should_reject(blurry)
+    assert not server.QualityFilter('flag').should_reject(blurry)
+
+def test_quality_filter_estimates_saved_inference():
+    quality_filter = server.QualityFilter('reject')
+    # Half the analysed images reached stage 2: 10 ms + 0.5 * 30 ms expected per image
+    quality_filter.record_inference(10.0, 30.0)
+    quality_filter.record_inference(10.0, 30.0)
+    quality_filter.record_inference(10.0)
+    quality_filter.record_inference(10.0)
+    for _ in range(3):
+        quality_filter.record_skip()
+
+    stats = quality_filter.stats()
+    assert stats['skipped'] == 3
+    assert stats['estimated_inference_saved_ms'] == pytest.approx(75.0)
+    assert stats['estimated_net_saved_ms'] == pytest.approx(75.0)
+
+def test_rejected_images_skip_inference(model_spec):
+    model = server.TeaLeafModel(quality_filter=server.QualityFilter('reject'), **model_spec)
+    result = model.analyze_image(Image.new('RGB', (200, 200), (60, 160, 50)))
+    assert result['quality']['rejected']
+    assert result['quality']['reasons'] == ['blurry']
+
+    result = model.analyze_image(noisy_image((170, 90, 40)))
+    assert not result['quality']['rejected']
+
+def test_registry_evicts_least_recently_used(model_spec):
+    registry = server.ModelRegistry({'a': model_spec, 'b': model_spec, 'c': model_spec})
+    footprint = registry.get('a').memory_footprint()
+
+    # Room for two models, not three
+    registry.memory_budget = int(footprint * 2.5)
+    registry.get('b')
+    registry.get('a')
+    registry.get('c')
+
+    stats = registry.stats()
+    assert stats['loaded'] == ['a', 'c']
+    assert stats['loads'] == 3
+    assert stats['evictions'] == 1
+
+    # Reloading an evicted model evicts the next least recently used one
+    registry.get('b')
+    assert registry.stats()['loaded'] == ['c', 'b']
+    assert registry.stats()['evictions'] == 2
+
+def test_cold_load_does_not_block_loaded_models(model_spec, monkeypatch):
+    registry = server.ModelRegistry({'a': model_spec, 'slow': model_spec})
+    loaded = registry.get('a')
+
+    started, release = threading.Event(), threading.Event()
+    real_model = server.TeaLeafModel
+
+    def slow_model(**spec):
+        started.set()
+        release.wait(10)
+        return real_model(**spec)
+
+    monkeypatch.setattr(server, 'TeaLeafModel', slow_model)
+    loader = threading.Thread(target=registry.get, args=('slow',))
+    loader.start()
+    try:
+        assert started.wait(10)
+        assert registry.get('a') is loaded
+        assert 'slow' in registry.loading
+    finally:
+        release.set()
+        loader.join()
+    assert 'slow' in registry.stats()['loaded']
+
+def test_keras_export_runs_at_other_resolution(model_spec):
+    # The stand-in disease model records [-1, 512, 512, 3] in its signature, like Keras exports
+    model = server.TeaLeafModel(**dict(model_spec, disease_input_size=[224, 224]))
+    interpreter = model.disease_interpreter
+    assert list(interpreter.get_input_details()[0]['shape']) == [1, 224, 224, 3]
+    assert list(interpreter.get_output_details()[0]['shape']) == [1, 4]
+
+def test_memory_footprint_counts_weights_once(model_spec):
+    model = server.TeaLeafModel(**model_spec)
+    files = os.path.getsize(model_spec['leaf_model_path']) + os.path.getsize(model_spec['disease_model_path'])
+    # Stage 2 input alone is 512 x 512 x 3 float32, in each of the two pooled interpreters
+    arena = 512 * 512 * 3 * 4
+    assert files + 2 * arena < model.memory_footprint() < files + 4 * arena